@@ -9,10 +9,13 @@ logging.basicConfig(level=logging.DEBUG)
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+# Let Apache/lighttpd stream downloads instead of a Python worker
+app.use_x_sendfile = os.environ.get('MEDIA_DOWNLOAD_OFFLOAD') == 'x-sendfile'
 
 # Import routes
 from routes import *
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Development only; production runs asgi.py under Uvicorn
+    app.run(host="0.0.0.0", port=5000, debug=os.environ.get("FLASK_DEBUG") == "1")
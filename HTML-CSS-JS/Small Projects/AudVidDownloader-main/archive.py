@@ -0,0 +1,118 @@
+import os
+import re
+import time
+import struct
+import zlib
+import zipfile
+
+# Media that is already compressed; deflating it again costs CPU for no gain
+COMPRESSED_EXTS = {
+    '.mp3', '.mp4', '.m4a', '.aac', '.webm', '.mkv', '.ogg', '.opus', '.flac', '.mov', '.avi',
+    '.jpg', '.jpeg', '.png', '.webp', '.zip', '.gz'
+}
+
+# Above these limits the archive needs zip64 records, which the streaming writer doesn't emit
+ZIP32_MAX_SIZE = 0xFFFFFFFF
+ZIP32_MAX_ENTRIES = 0xFFFF
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def archive_name(file_info):
+    """Name of a processed file inside the archive, e.g. 001_Title.mp3"""
+    clean_title = re.sub(r'[^\w\s-]', '', file_info['title'])
+    ext = os.path.splitext(file_info['path'])[1]
+    return f"{file_info['index']+1:03d}_{clean_title[:50]}{ext}"
+
+
+def archive_entry(path, name):
+    """Describe a file for ZipStream: size, CRC-32 and timestamp, read once up front"""
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    stat = os.stat(path)
+    return {'path': path, 'name': name, 'size': stat.st_size, 'crc': crc, 'mtime': stat.st_mtime}
+
+
+def add_to_zip(zipf, path, name):
+    """Write a file into an open zip, storing compressed media as-is"""
+    ext = os.path.splitext(path)[1].lower()
+    compress_type = zipfile.ZIP_STORED if ext in COMPRESSED_EXTS else zipfile.ZIP_DEFLATED
+    zipf.write(path, name, compress_type=compress_type)
+
+
+class ZipStream:
+    """A STORED zip archive generated on the fly from files on disk
+
+    Every entry's size and CRC are known in advance, so the archive's total
+    length and the position of every byte are fixed before anything is sent.
+    That gives an exact Content-Length and lets Range requests start anywhere.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.segments = []  # ('bytes', data) or ('file', path, size), in archive order
+        central = []
+        offset = 0
+
+        for entry in entries:
+            name = entry['name'].encode('utf-8')
+            dos_time, dos_date = self._dos_datetime(entry['mtime'])
+            local = struct.pack(
+                '<4s5H3L2H', b'PK\x03\x04', 20, 0x800, zipfile.ZIP_STORED, dos_time, dos_date,
+                entry['crc'], entry['size'], entry['size'], len(name), 0
+            ) + name
+            central.append(struct.pack(
+                '<4s6H3L5H2L', b'PK\x01\x02', 20 | (3 << 8), 20, 0x800, zipfile.ZIP_STORED, dos_time, dos_date,
+                entry['crc'], entry['size'], entry['size'], len(name), 0, 0, 0, 0, 0o100644 << 16, offset
+            ) + name)
+            self.segments.append(('bytes', local))
+            self.segments.append(('file', entry['path'], entry['size']))
+            offset += len(local) + entry['size']
+
+        directory = b''.join(central)
+        end = struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, len(entries), len(entries), len(directory), offset, 0)
+        self.segments.append(('bytes', directory + end))
+        self.size = offset + len(directory) + len(end)
+
+    @staticmethod
+    def supports(entries):
+        """Whether entries fit in a plain (non-zip64) archive"""
+        total = sum(entry['size'] + 200 + len(entry['name'].encode('utf-8')) for entry in entries)
+        return len(entries) < ZIP32_MAX_ENTRIES and total < ZIP32_MAX_SIZE
+
+    @property
+    def etag(self):
+        crcs = ''.join(f"{entry['crc']:08x}{entry['name']}" for entry in self.entries)
+        return f"{zlib.crc32(crcs.encode('utf-8')):08x}-{self.size}"
+
+    def iter_range(self, start=0, stop=None):
+        """Yield the archive bytes in [start, stop)"""
+        stop = self.size if stop is None else stop
+        position = 0
+        for segment in self.segments:
+            length = len(segment[1]) if segment[0] == 'bytes' else segment[2]
+            seg_start, seg_stop = max(start, position), min(stop, position + length)
+            if seg_start < seg_stop:
+                if segment[0] == 'bytes':
+                    yield segment[1][seg_start - position:seg_stop - position]
+                else:
+                    yield from self._read_file(segment[1], seg_start - position, seg_stop - seg_start)
+            position += length
+            if position >= stop:
+                break
+
+    def _read_file(self, path, offset, remaining):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"{path} is shorter than when the archive was planned")
+                remaining -= len(chunk)
+                yield chunk
+
+    def _dos_datetime(self, timestamp):
+        t = time.localtime(max(timestamp, 315532800))  # DOS dates start in 1980
+        return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
@@ -0,0 +1,268 @@
+"""ASGI entry point for production
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+Status long-polls and Server-Sent Events are served by coroutines that wait
+on job change notifications, so an idle watcher costs no thread. Every other
+route runs the Flask app in a thread pool, one call at a time: the view runs
+in one call, and each chunk of the response body (file downloads, streamed
+archives) is read in another. Slow clients therefore never hold a thread
+between chunks. Downloads and transcodes keep running in the converter's own
+worker pools either way.
+"""
+import os
+import io
+import re
+import sys
+import json
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from werkzeug.wsgi import FileWrapper
+from app import app as flask_app
+from routes import converter
+
+# Flask views and body reads share this pool
+THREADS = int(os.environ.get('MEDIA_ASGI_THREADS', 32))
+# Largest request body read into memory for a Flask view
+MAX_BODY = 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+STATUS_ROUTE = re.compile(r'^/status/([^/]+)$')
+EVENTS_ROUTE = re.compile(r'^/events/([^/]+)$')
+FINISHED = ('completed', 'error', 'not_found')
+
+
+class ChunkedFileWrapper(FileWrapper):
+    """wsgi.file_wrapper that reads files in large blocks, so a download needs few thread hops"""
+
+    def __init__(self, file, buffer_size=CHUNK_SIZE):
+        super().__init__(file, max(buffer_size, CHUNK_SIZE))
+
+
+class JobWatcher:
+    """Lets coroutines wait for job changes without parking a thread per waiter"""
+
+    def __init__(self, converter, loop):
+        self.converter = converter
+        self.loop = loop
+        self._waiters = {}  # job_id -> set of asyncio.Event
+        converter.add_listener(self._notify)
+
+    def _notify(self, job_id):
+        # Called from converter threads
+        if job_id in self._waiters:
+            self.loop.call_soon_threadsafe(self._wake, job_id)
+
+    def _wake(self, job_id):
+        for event in self._waiters.pop(job_id, ()):
+            event.set()
+
+    async def wait_for_update(self, job_id, since_version=-1, timeout=25):
+        """Wait until a job changes past since_version; returns its status, or None on timeout"""
+        deadline = self.loop.time() + timeout
+        while True:
+            # Register before looking, so a change in between still wakes us
+            event = asyncio.Event()
+            self._waiters.setdefault(job_id, set()).add(event)
+            try:
+                status = await self.loop.run_in_executor(None, self.converter.get_status, job_id)
+                if status['status'] == 'not_found' or status.get('version', 0) > since_version:
+                    return status
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    return None
+                # Jobs run by other worker processes only change in the store, so poll those
+                if job_id not in self.converter.jobs:
+                    remaining = min(self.converter.flush_interval, remaining)
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                waiters = self._waiters.get(job_id)
+                if waiters is not None:
+                    waiters.discard(event)
+                    if not waiters:
+                        del self._waiters[job_id]
+
+
+class MediaConverterASGI:
+    """ASGI application: native status/event routes in front of the Flask app"""
+
+    def __init__(self, wsgi_app, converter):
+        self.wsgi_app = wsgi_app
+        self.converter = converter
+        self.executor = None
+        self.watcher = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        self._start()
+
+        path = scope['path']
+        if scope['method'] == 'GET' and STATUS_ROUTE.match(path):
+            await self._status(scope, send, STATUS_ROUTE.match(path).group(1))
+        elif scope['method'] == 'GET' and EVENTS_ROUTE.match(path):
+            await self._events(receive, send, EVENTS_ROUTE.match(path).group(1))
+        else:
+            await self._call_wsgi(scope, receive, send)
+
+    def _start(self):
+        if self.executor is None:
+            loop = asyncio.get_running_loop()
+            self.executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='asgi')
+            loop.set_default_executor(self.executor)
+            self.watcher = JobWatcher(self.converter, loop)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.executor:
+                    self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _status(self, scope, send, job_id):
+        """Same as the Flask /status route; ?since=<version> long-polls until the job changes"""
+        try:
+            since = parse_qs(scope['query_string'].decode('latin-1')).get('since', [None])[0]
+            if since is not None and since.lstrip('-').isdigit():
+                status = await self.watcher.wait_for_update(job_id, int(since), timeout=25)
+                if status is None:
+                    status = await asyncio.get_running_loop().run_in_executor(None, self.converter.get_status, job_id)
+            else:
+                status = await asyncio.get_running_loop().run_in_executor(None, self.converter.get_status, job_id)
+            await self._send_json(send, 200, status)
+        except Exception as e:
+            logging.error(f"Status error: {str(e)}")
+            await self._send_json(send, 500, {'error': 'Failed to get status'})
+
+    async def _events(self, receive, send, job_id):
+        """Same as the Flask /events route: job status as Server-Sent Events until the job finishes"""
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+                        (b'x-accel-buffering', b'no')]
+        })
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            version = -1
+            while not disconnected.done():
+                status = await self.watcher.wait_for_update(job_id, version, timeout=15)
+                if status is None:
+                    # Nothing changed; resend so queue position/ETA stay fresh and proxies keep the connection
+                    status = await asyncio.get_running_loop().run_in_executor(None, self.converter.get_status, job_id)
+                version = status.get('version', version)
+                await send({'type': 'http.response.body', 'body': f"data: {json.dumps(status)}\n\n".encode('utf-8'),
+                            'more_body': True})
+                if status['status'] in FINISHED:
+                    break
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        except Exception as e:
+            logging.error(f"Event stream error: {str(e)}")
+        finally:
+            disconnected.cancel()
+
+    async def _call_wsgi(self, scope, receive, send):
+        """Run the Flask app for one request, reading the response body a chunk at a time"""
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if len(body) > MAX_BODY:
+                await self._send_json(send, 413, {'error': 'Request body too large'})
+                return
+
+        loop = asyncio.get_running_loop()
+        # Every call for this request runs in the same context, so Flask's context
+        # locals survive generators being resumed on different threads
+        context = contextvars.copy_context()
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            return lambda data: None  # write() is unused by Flask
+
+        def call(func, *args):
+            return loop.run_in_executor(self.executor, context.run, func, *args)
+
+        iterable = await call(self.wsgi_app, self._environ(scope, body), start_response)
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            iterator = iter(iterable)
+            # Streaming responses may only call start_response once the first chunk is produced
+            chunk = await call(next, iterator, None)
+            await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+            while chunk is not None and not disconnected.done():
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await call(next, iterator, None)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnected.cancel()
+            if hasattr(iterable, 'close'):
+                await call(iterable.close)
+
+    def _environ(self, scope, body):
+        """Build a WSGI environ (PEP 3333) from an ASGI HTTP scope"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': ChunkedFileWrapper
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+        return environ
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _send_json(self, send, status, data):
+        body = json.dumps(data).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('latin-1'))]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+app = MediaConverterASGI(flask_app, converter)
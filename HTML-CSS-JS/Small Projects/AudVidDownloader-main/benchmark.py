@@ -0,0 +1,358 @@
+"""Offline benchmark for the conversion pipeline
+
+Generates fixture media with FFmpeg's lavfi test sources, serves it from a
+local HTTP server (yt-dlp picks it up through its generic extractor, and an
+RSS feed stands in for playlists), then runs MediaConverter end to end.
+
+    python benchmark.py                               # every format, single/batch/playlist
+    python benchmark.py --formats mp3 mp4 --concurrency 1 4 8 --jobs 8
+    python benchmark.py --load --clients 16 --duration 60   # hammer the Flask routes
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+FIXTURES = {
+    'clip.mp4': ['-f', 'lavfi', '-i', 'testsrc2=size=640x360:rate=25', '-f', 'lavfi', '-i', 'sine=frequency=440',
+                 '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-c:a', 'aac'],
+    'clip.webm': ['-f', 'lavfi', '-i', 'testsrc2=size=640x360:rate=25', '-f', 'lavfi', '-i', 'sine=frequency=330',
+                  '-c:v', 'libvpx', '-deadline', 'realtime', '-cpu-used', '8', '-b:v', '500k', '-c:a', 'libopus'],
+    'tone.webm': ['-f', 'lavfi', '-i', 'sine=frequency=550', '-vn', '-c:a', 'libopus'],
+    'tone.m4a': ['-f', 'lavfi', '-i', 'sine=frequency=660', '-vn', '-c:a', 'aac']
+}
+VIDEO_SOURCES = ['clip.mp4', 'clip.webm']
+AUDIO_SOURCES = ['tone.webm', 'tone.m4a', 'clip.mp4']
+
+
+def generate_fixtures(directory, seconds):
+    """Render the fixture clips with FFmpeg, skipping ones that already exist"""
+    os.makedirs(directory, exist_ok=True)
+    for name, args in FIXTURES.items():
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            continue
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y'] + args + ['-t', str(seconds), path]
+        subprocess.run(cmd, check=True)
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serves fixture files, plus /playlist.rss listing them as a podcast feed"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/playlist.rss':
+            return super().do_GET()
+        # The query string (e.g. ?run=...) is copied onto every item so each
+        # benchmark job gets URLs nothing else has converted
+        query = self.path.partition('?')[2]
+        base = f"http://{self.headers['Host']}"
+        items = ''.join(
+            f"<item><title>{name}</title><guid>{name}-{query}</guid>"
+            f"<enclosure url=\"{base}/{name}?{query}\" type=\"video/mp4\"/></item>"
+            for name in self.server.playlist
+        )
+        body = (f"<?xml version=\"1.0\"?><rss version=\"2.0\"><channel><title>Benchmark playlist</title>"
+                f"{items}</channel></rss>").encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # yt-dlp and FFmpeg routinely hang up mid-file after probing
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def start_fixture_server(directory, playlist):
+    server = FixtureServer(('127.0.0.1', 0), partial(FixtureHandler, directory=directory))
+    server.playlist = playlist
+    thread = threading.Thread(target=server.serve_forever, name='fixture-server')
+    thread.daemon = True
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class ResourceSampler:
+    """Tracks peak RSS (this process plus child FFmpeg/yt-dlp processes) and work-dir disk usage"""
+
+    def __init__(self, work_root, interval=0.2):
+        self.work_root = work_root
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak_rss = self.peak_disk = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='resource-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, self._tree_rss())
+            self.peak_disk = max(self.peak_disk, self._disk_usage())
+            self._stop.wait(self.interval)
+
+    def _tree_rss(self):
+        pid = os.getpid()
+        total = 0
+        try:
+            pids = [p for p in os.listdir('/proc') if p.isdigit()]
+        except OSError:
+            return 0
+        for p in pids:
+            try:
+                with open(f'/proc/{p}/status') as f:
+                    fields = dict(line.split(':', 1) for line in f if ':' in line)
+            except OSError:
+                continue
+            if int(p) == pid or int(fields.get('PPid', '0').strip()) == pid:
+                total += int(fields.get('VmRSS', '0 kB').split()[0]) * 1024
+        return total
+
+    def _disk_usage(self):
+        total = 0
+        for root, _, names in os.walk(self.work_root):
+            for name in names:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def job_urls(base_url, output_format, kind, batch_size):
+    """Build the URL (or URL list) for one job; a unique query string keeps jobs from deduplicating"""
+    sources = VIDEO_SOURCES if output_format in ('mp4', 'webm', 'mkv') else AUDIO_SOURCES
+    run = uuid.uuid4().hex[:12]
+    if kind == 'playlist':
+        return f"{base_url}/playlist.rss?run={run}"
+    if kind == 'batch':
+        return [f"{base_url}/{sources[i % len(sources)]}?run={run}-{i}" for i in range(batch_size)]
+    return f"{base_url}/{random.choice(sources)}?run={run}"
+
+
+def run_job(converter, url, output_format, timeout):
+    """Convert one job to completion; returns (status, seconds)"""
+    job_id = str(uuid.uuid4())
+    started = time.time()
+    result = converter.convert(url, output_format, 'best', job_id, client_id=f'bench-{job_id}')
+    if not result['success']:
+        return 'rejected', time.time() - started
+    job_id = result['job_id']
+    version = -1
+    while time.time() - started < timeout:
+        status = converter.wait_for_update(job_id, version, timeout=5) or converter.get_status(job_id)
+        version = status.get('version', version)
+        if status['status'] in ('completed', 'error', 'not_found'):
+            break
+    elapsed = time.time() - started
+    converter.cleanup_file(job_id)
+    return status['status'], elapsed
+
+
+def run_pipeline(args, base_url):
+    from converter import MediaConverter
+    converter = MediaConverter()
+    formats = args.formats or list(converter.get_supported_formats())
+    sampler = ResourceSampler(converter.work_root)
+    results = []
+
+    for output_format in formats:
+        for kind in args.kinds:
+            for concurrency in args.concurrency:
+                jobs = max(args.jobs, concurrency)
+                with sampler, ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    started = time.time()
+                    outcomes = list(pool.map(
+                        lambda _: run_job(converter, job_urls(base_url, output_format, kind, args.batch_size),
+                                          output_format, args.timeout),
+                        range(jobs)
+                    ))
+                    wall = time.time() - started
+                latencies = [seconds for status, seconds in outcomes if status == 'completed']
+                row = {
+                    'format': output_format, 'kind': kind, 'concurrency': concurrency, 'jobs': jobs,
+                    'completed': len(latencies), 'failed': jobs - len(latencies),
+                    'jobs_per_min': round(len(latencies) / wall * 60, 2),
+                    'p50': percentile(latencies, 50), 'p95': percentile(latencies, 95),
+                    'peak_rss_mb': round(sampler.peak_rss / 1024 ** 2, 1),
+                    'peak_disk_mb': round(sampler.peak_disk / 1024 ** 2, 1)
+                }
+                results.append(row)
+                print_row(row)
+    return results
+
+
+def run_load(args, base_url):
+    """Drive the HTTP routes with concurrent clients for a fixed duration"""
+    target = args.target
+    server = None
+    if not target:
+        from werkzeug.serving import make_server
+        from app import app
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+        target = f"http://127.0.0.1:{server.server_port}"
+
+    formats = args.formats or ['mp3', 'mp4']
+    deadline = time.time() + args.duration
+    timings = {'convert': [], 'status': [], 'download': [], 'cleanup': [], 'end_to_end': []}
+    codes = {}
+    lock = threading.Lock()
+
+    def request(route, path, body=None, method=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(target + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        started = time.time()
+        try:
+            with urllib.request.urlopen(req, timeout=args.timeout) as resp:
+                code, payload, headers = resp.status, resp.read(), resp.headers
+        except urllib.error.HTTPError as e:
+            code, payload, headers = e.code, e.read(), e.headers
+        with lock:
+            timings[route].append(time.time() - started)
+            codes[f"{route} {code}"] = codes.get(f"{route} {code}", 0) + 1
+        return code, payload, headers
+
+    def client():
+        while time.time() < deadline:
+            output_format = random.choice(formats)
+            started = time.time()
+            url = job_urls(base_url, output_format, 'single', 1)
+            code, payload, headers = request('convert', '/convert', {'url': url, 'format': output_format})
+            if code in (429, 503):
+                time.sleep(min(float(headers.get('Retry-After') or 1), 5))
+                continue
+            if code != 200:
+                continue
+            job_id = json.loads(payload)['job_id']
+            version = -1
+            status = {}
+            while time.time() < deadline + args.timeout:
+                _, payload, _ = request('status', f'/status/{job_id}?since={version}')
+                status = json.loads(payload)
+                version = status.get('version', version)
+                if status.get('status') in ('completed', 'error', 'not_found'):
+                    break
+            if status.get('status') == 'completed':
+                request('download', f'/download/{job_id}')
+                with lock:
+                    timings['end_to_end'].append(time.time() - started)
+            request('cleanup', f'/cleanup/{job_id}', {}, method='POST')
+
+    threads = [threading.Thread(target=client, name=f'client-{i}') for i in range(args.clients)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.time() - started
+    if server:
+        server.shutdown()
+
+    result = {
+        'clients': args.clients, 'seconds': round(wall, 1),
+        'jobs_per_min': round(len(timings['end_to_end']) / wall * 60, 2),
+        'responses': codes,
+        'latency': {route: {'count': len(values), 'p50': percentile(values, 50), 'p95': percentile(values, 95)}
+                    for route, values in timings.items()}
+    }
+    print(json.dumps(result, indent=2))
+    return result
+
+
+def print_row(row):
+    def fmt(value):
+        return '-' if value is None else f"{value:.2f}"
+    print(f"{row['format']:<5} {row['kind']:<8} c={row['concurrency']:<3} "
+          f"ok={row['completed']}/{row['jobs']:<3} {row['jobs_per_min']:>8.2f} jobs/min  "
+          f"p50={fmt(row['p50'])}s p95={fmt(row['p95'])}s  "
+          f"rss={row['peak_rss_mb']}MB disk={row['peak_disk_mb']}MB", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the media conversion pipeline offline')
+    parser.add_argument('--formats', nargs='+', help='output formats (default: all supported)')
+    parser.add_argument('--kinds', nargs='+', default=['single', 'batch', 'playlist'],
+                        choices=['single', 'batch', 'playlist'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4], help='jobs in flight at once')
+    parser.add_argument('--jobs', type=int, default=4, help='jobs per scenario (at least the concurrency)')
+    parser.add_argument('--batch-size', type=int, default=3, help='URLs per batch job')
+    parser.add_argument('--seconds', type=int, default=10, help='fixture clip length')
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'mediaconverter-bench-fixtures'))
+    parser.add_argument('--timeout', type=float, default=600, help='per-job timeout in seconds')
+    parser.add_argument('--cache', action='store_true', help='keep the result cache on (off by default)')
+    parser.add_argument('--json', help='also write results to this file')
+    parser.add_argument('--load', action='store_true', help='load-test the Flask routes instead')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients in load mode')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run load mode')
+    parser.add_argument('--target', help='base URL of a running server for load mode (default: in-process)')
+    args = parser.parse_args()
+
+    # Keep benchmark state away from a real deployment's, and measure conversions rather than cache hits
+    os.environ.setdefault('MEDIA_WORK_DIR', os.path.join(tempfile.gettempdir(), 'mediaconverter-bench'))
+    os.environ.setdefault('MEDIA_JOB_STORE', 'memory')
+    os.environ.setdefault('MEDIA_MAX_JOBS_PER_CLIENT', '1000')
+    os.environ.setdefault('MEDIA_MAX_QUEUE', '1000')
+    os.environ.setdefault('MEDIA_RATE_LIMIT_PER_MINUTE', '0')
+    os.environ.setdefault('MEDIA_MAX_BYTES_PER_DAY', '0')
+    os.environ.setdefault('MEDIA_RATE_LIMIT_STORE', 'memory')
+    if not args.cache:
+        os.environ['MEDIA_CACHE_MAX_BYTES'] = '0'
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    logging.basicConfig(level=logging.WARNING)
+
+    generate_fixtures(args.fixtures, args.seconds)
+    server, base_url = start_fixture_server(args.fixtures, VIDEO_SOURCES + AUDIO_SOURCES[:2])
+    try:
+        results = run_load(args, base_url) if args.load else run_pipeline(args, base_url)
+    finally:
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
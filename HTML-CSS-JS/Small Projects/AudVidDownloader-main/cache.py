@@ -0,0 +1,240 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def link_or_copy(src, dst):
+    """Hard link src to dst, falling back to a copy across filesystems"""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class ResultCache:
+    """Content-addressed on-disk cache of converted outputs with LRU eviction and TTL"""
+
+    def __init__(self, cache_dir=None, max_bytes=None, ttl=None):
+        self.cache_dir = cache_dir or os.environ.get(
+            'MEDIA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'mediaconverter-cache'))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.environ.get('MEDIA_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+        self.ttl = ttl if ttl is not None else int(os.environ.get('MEDIA_CACHE_TTL', 7 * 24 * 3600))
+        self.enabled = self.max_bytes > 0
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()  # key -> {'path', 'size', 'created', 'meta'}, oldest access first
+        self._total_bytes = 0
+        self._in_flight = {}  # key -> threading.Event
+        self._lock = threading.Lock()
+
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load_index()
+
+    @staticmethod
+    def make_key(extractor, media_id, output_format, quality=None, bitrate=None):
+        """Build a cache key from the source identity and the output settings"""
+        raw = f"{extractor}:{media_id}:{output_format}:{quality or '-'}:{bitrate or '-'}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return (path, meta) for a fresh cached artifact, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Another worker process may have stored it since we loaded the index
+                entry = self._read_entry(key)
+                if entry:
+                    self._entries[key] = entry
+                    self._total_bytes += entry['size']
+            if entry and time.time() - entry['created'] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry and not os.path.exists(entry['path']):
+                # Evicted by another process sharing the directory
+                self._remove(key)
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            try:
+                # Persist recency so LRU order survives restarts
+                os.utime(entry['path'])
+            except OSError:
+                pass
+            return entry['path'], entry['meta']
+
+    def put(self, key, file_path, meta=None):
+        """Store a finished output under key; the original file is left in place"""
+        if not self.enabled or not os.path.exists(file_path):
+            return None
+        ext = os.path.splitext(file_path)[1]
+        cached_path = os.path.join(self.cache_dir, f"{key}{ext}")
+        tmp_path = f"{cached_path}.tmp{threading.get_ident()}"
+        try:
+            link_or_copy(file_path, tmp_path)
+            os.replace(tmp_path, cached_path)
+            # A link or copy keeps the source's mtime; newest is what LRU eviction needs to see
+            os.utime(cached_path)
+            created = time.time()
+            with open(os.path.join(self.cache_dir, f"{key}.json"), 'w') as f:
+                json.dump({'file': os.path.basename(cached_path), 'created': created, 'meta': meta or {}}, f)
+        except OSError as e:
+            logging.error(f"Cache store error: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            size = os.path.getsize(cached_path)
+            self._entries[key] = {'path': cached_path, 'size': size, 'created': created, 'meta': meta or {}}
+            self._total_bytes += size
+            self._evict()
+        return cached_path
+
+    def claim(self, key):
+        """Claim a key for production; returns None if claimed, else an Event to wait on"""
+        with self._lock:
+            event = self._in_flight.get(key)
+            if event:
+                return event
+            self._in_flight[key] = threading.Event()
+            return None
+
+    def release(self, key):
+        """Release a claimed key and wake any waiters"""
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event:
+            event.set()
+
+    def stats(self):
+        """Get cache usage statistics"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            entry = self._read_entry(name[:-len('.json')])
+            if entry:
+                entries.append((entry['mtime'], name[:-len('.json')], entry))
+
+        with self._lock:
+            for _, key, entry in sorted(entries, key=lambda e: e[:2]):
+                self._entries[key] = entry
+                self._total_bytes += entry['size']
+            self._evict()
+
+    def _read_entry(self, key):
+        """Load one entry from its {key}.json record, or None if it is missing or incomplete"""
+        try:
+            with open(os.path.join(self.cache_dir, f"{key}.json")) as f:
+                record = json.load(f)
+            path = os.path.join(self.cache_dir, record['file'])
+            stat = os.stat(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'created': record['created'],
+                'meta': record.get('meta', {})}
+
+    def _evict(self):
+        now = time.time()
+        for key in [k for k, e in self._entries.items() if now - e['created'] > self.ttl]:
+            self._remove(key)
+
+        # Every worker process writes to the same directory, so enforce the limit on
+        # what is actually there; hits touch the file, so mtime is the shared LRU order
+        artifacts = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.json') or '.tmp' in entry.name:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            artifacts.append((stat.st_mtime, entry.name.split('.')[0], entry.path, stat.st_size))
+        total = sum(artifact[3] for artifact in artifacts)
+        for _, key, path, size in sorted(artifacts):
+            if total <= self.max_bytes:
+                break
+            self._remove(key, path)
+            total -= size
+        self._total_bytes = total
+
+    def _remove(self, key, path=None):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._total_bytes -= entry['size']
+            path = entry['path']
+        for path in (path, os.path.join(self.cache_dir, f"{key}.json")):
+            if not path:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class MetadataCache:
+    """In-memory LRU cache of yt-dlp extraction results with a TTL"""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or int(os.environ.get('MEDIA_METADATA_MAX_ENTRIES', 512))
+        # Extracted stream URLs expire on most sites, so keep this short
+        self.ttl = ttl if ttl is not None else int(os.environ.get('MEDIA_METADATA_TTL', 300))
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value), oldest access first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def discard(self, key):
+        """Forget a cached value"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries past the limit"""
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
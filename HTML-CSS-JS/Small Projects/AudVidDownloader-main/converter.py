@@ -1,18 +1,152 @@
 import os
+import sys
 import subprocess
 import tempfile
 import logging
-import re
 import json
+import socket
 import threading
 import time
+import copy
+import itertools
+import random
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 import yt_dlp
+from yt_dlp.extractor import gen_extractor_classes
+from scheduler import JobScheduler, QueueFullError
+from cache import ResultCache, MetadataCache, link_or_copy
+from job_store import create_job_store
+from janitor import Janitor, remove_path
+from archive import ZipStream, archive_entry, archive_name, add_to_zip
+from metrics import Metrics
+from ratelimit import RateLimiter
 
 class MediaConverter:
+    # Containers FFmpeg can decode from a non-seekable pipe
+    STREAMABLE_EXTS = {'webm', 'mkv', 'mp3', 'ogg', 'opus', 'flac', 'wav', 'aac', 'ts', 'flv'}
+    
+    # Codecs each target container can hold without re-encoding; None means anything goes
+    CONTAINER_CODECS = {
+        'mp4': {'video': {'h264', 'hevc', 'av1'}, 'audio': {'aac', 'mp3', 'ac3', 'eac3'}},
+        'mkv': {'video': None, 'audio': None},
+        'webm': {'video': {'vp8', 'vp9', 'av1'}, 'audio': {'opus', 'vorbis'}},
+        'm4a': {'audio': {'aac', 'alac'}},
+        'aac': {'audio': {'aac'}},
+        'mp3': {'audio': {'mp3'}},
+        'flac': {'audio': {'flac'}},
+        'wav': {'audio': {'pcm_s16le'}}
+    }
+    
+    # Encoder settings per speed tier; formats not listed encode the same way at every tier
+    ENCODER_PRESETS = ('fast', 'balanced', 'quality')
+    ENCODER_PROFILES = {
+        'mp4': {
+            'fast': ['-preset', 'veryfast', '-crf', '26'],
+            'balanced': ['-preset', 'medium', '-crf', '23'],
+            'quality': ['-preset', 'slow', '-crf', '20']
+        },
+        'mkv': {
+            'fast': ['-preset', 'veryfast', '-crf', '26'],
+            'balanced': ['-preset', 'medium', '-crf', '23'],
+            'quality': ['-preset', 'slow', '-crf', '20']
+        },
+        # libvpx-vp9 defaults to the slowest settings; constant quality needs -b:v 0
+        'webm': {
+            'fast': ['-deadline', 'realtime', '-cpu-used', '8', '-row-mt', '1', '-tile-columns', '2', '-crf', '36', '-b:v', '0'],
+            'balanced': ['-deadline', 'good', '-cpu-used', '4', '-row-mt', '1', '-tile-columns', '2', '-crf', '32', '-b:v', '0'],
+            'quality': ['-deadline', 'good', '-cpu-used', '1', '-row-mt', '1', '-crf', '30', '-b:v', '0']
+        },
+        'mp3': {
+            'fast': ['-compression_level', '7'],
+            'balanced': [],
+            'quality': ['-compression_level', '0']
+        },
+        'flac': {
+            'fast': ['-compression_level', '0'],
+            'balanced': [],
+            'quality': ['-compression_level', '8']
+        }
+    }
+    
+    # Failures that won't go away by trying again
+    PERMANENT_ERRORS = ('Unsupported URL', 'Private video', 'Video unavailable', 'not available in your country',
+                        'Sign in to confirm your age', 'Unsupported format', 'HTTP Error 404')
+    
+    # Rough figures behind the size/time estimates in get_video_info. Audio rates are
+    # FFmpeg's default output bitrates (typical averages for WAV/FLAC); video rates are
+    # x264 at the balanced CRF (audio included), keyed by the lowest height they cover
+    AUDIO_KBPS = {'mp3': 192, 'aac': 128, 'm4a': 128, 'wav': 1411, 'flac': 900}
+    ESTIMATE_VIDEO_KBPS = ((360, 800), (480, 1400), (720, 2800), (1080, 5500), (2160, 18000))
+    ESTIMATE_SIZE_FACTORS = {'fast': 0.8, 'balanced': 1.0, 'quality': 1.35, 'webm': 0.7}
+    # Encoding speed as a multiple of playback speed
+    ESTIMATE_ENCODE_SPEED = {
+        'mp3': 60, 'aac': 80, 'm4a': 80, 'wav': 400, 'flac': 150,
+        'mp4': {'fast': 4, 'balanced': 1.5, 'quality': 0.6},
+        'mkv': {'fast': 4, 'balanced': 1.5, 'quality': 0.6},
+        'webm': {'fast': 3, 'balanced': 0.8, 'quality': 0.3}
+    }
+    ESTIMATE_REMUX_SPEED = 300
+    
+    # yt-dlp codec string prefixes mapped to FFmpeg codec names (first match wins)
+    CODEC_ALIASES = [
+        ('avc', 'h264'), ('h264', 'h264'), ('hev', 'hevc'), ('hvc', 'hevc'), ('h265', 'hevc'),
+        ('vp09', 'vp9'), ('vp9', 'vp9'), ('vp8', 'vp8'), ('av01', 'av1'), ('av1', 'av1'),
+        ('mp4a.40.34', 'mp3'), ('mp4a', 'aac'), ('aac', 'aac'), ('mp3', 'mp3'), ('opus', 'opus'),
+        ('vorbis', 'vorbis'), ('flac', 'flac'), ('alac', 'alac'), ('ac-3', 'ac3'), ('ec-3', 'eac3')
+    ]
+    
     def __init__(self):
-        self.temp_dir = tempfile.gettempdir()
-        self.jobs = {}  # Store job information
+        # Every job works in its own directory so cleanup is a single rmtree
+        self.work_root = os.environ.get('MEDIA_WORK_DIR', os.path.join(tempfile.gettempdir(), 'mediaconverter'))
+        os.makedirs(self.work_root, exist_ok=True)
+        self.jobs = {}  # Jobs this process is running; the store is the shared copy
+        self.scheduler = JobScheduler()
+        self.metrics = Metrics()
+        self.cache = ResultCache()
+        self.metadata_cache = MetadataCache()
+        self._extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+        
+        # Compile every extractor's URL pattern up front so the first request doesn't pay for it
+        warmup = threading.Thread(target=self._match_extractor, args=('https://example.invalid/',))
+        warmup.daemon = True
+        warmup.start()
+        self.item_concurrency = int(os.environ.get('MEDIA_ITEM_CONCURRENCY', 3))
+        # Most playlist items one job will take, whatever range was asked for
+        self.playlist_max_items = int(os.environ.get('MEDIA_PLAYLIST_MAX_ITEMS', 50))
+        # Parallel extractions for one batch /info lookup
+        self.info_concurrency = int(os.environ.get('MEDIA_INFO_CONCURRENCY', 4))
+        self.streaming = os.environ.get('MEDIA_STREAMING', '1') != '0'
+        # A streamed item runs as long as its download, so it's only killed after this long without progress
+        self.stream_stall_timeout = float(os.environ.get('MEDIA_STREAM_STALL_TIMEOUT', 120))
+        self.item_retries = int(os.environ.get('MEDIA_ITEM_RETRIES', 2))
+        self.retry_backoff = float(os.environ.get('MEDIA_RETRY_BACKOFF', 2.0))
+        self.max_resumes = int(os.environ.get('MEDIA_MAX_RESUMES', 3))
+        # Parallel fragment downloads for DASH/HLS sources
+        self.fragment_concurrency = int(os.environ.get('MEDIA_FRAGMENT_CONCURRENCY', 4))
+        # 'auto' encodes with 'balanced' normally and drops to 'fast' when the queue backs up
+        self.default_preset = os.environ.get('MEDIA_ENCODER_PRESET', 'auto')
+        # Threads per FFmpeg encode; 0 splits the cores between the encodes running when each one starts
+        self.ffmpeg_threads = int(os.environ.get('MEDIA_FFMPEG_THREADS', 0))
+        self._running_encodes = 0
+        # 'stream' builds multi-file archives on the fly at download time, 'file' writes a zip to disk
+        self.archive_mode = os.environ.get('MEDIA_ARCHIVE_MODE', 'stream')
+        self._lock = threading.RLock()
+        # Signalled whenever a job changes, for push-style status updates
+        self._changed = threading.Condition(self._lock)
+        self._listeners = []
+        
+        # Shared job state so any worker process can serve /status and /download
+        self.store = create_job_store()
+        self.flush_interval = float(os.environ.get('MEDIA_JOB_FLUSH_INTERVAL', 1.0))
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._dirty = set()
+        self._flush_requested = threading.Event()
+        # Per-client limits, checked by /convert before anything is queued
+        self.limiter = RateLimiter(self.store.active_count)
+        self.janitor = Janitor(self)
+        self._setup_metrics()
         self.supported_formats = {
             'mp3': {'type': 'audio', 'codec': 'mp3', 'bitrates': ['128k', '192k', '256k', '320k']},
             'mp4': {'type': 'video', 'codec': 'mp4', 'qualities': ['360p', '480p', '720p', '1080p']},
@@ -23,257 +157,1226 @@ class MediaConverter:
             'flac': {'type': 'audio', 'codec': 'flac', 'bitrates': ['lossless']},
             'mkv': {'type': 'video', 'codec': 'mkv', 'qualities': ['480p', '720p', '1080p', '4k']}
         }
+        for format_name, options in self.supported_formats.items():
+            options['presets'] = list(self.ENCODER_PRESETS) if format_name in self.ENCODER_PROFILES else []
+        
+        # Background work last: resumed jobs and the janitor need everything above
+        self._recover_orphaned_jobs()
+        flusher = threading.Thread(target=self._flush_loop, name='job-store-flush')
+        flusher.daemon = True
+        flusher.start()
+        self.janitor.start()
         
-    def validate_url(self, url):
-        """Validate if URL is supported by yt-dlp"""
+    def validate_url(self, url, deep=False):
+        """Validate if URL is supported by yt-dlp
+        
+        The default check is syntactic plus an offline extractor match so it is
+        cheap enough to run inside a request; deep=True also extracts metadata.
+        Jobs do the deep check themselves when they extract each item.
+        """
         try:
             parsed = urlparse(url)
-            if not parsed.scheme or not parsed.netloc:
+            if parsed.scheme not in ('http', 'https') or not parsed.netloc:
                 return False
             
-            # Use yt-dlp to check if URL is supported
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': True
-            }
+            extractor = self._match_extractor(url)
+            if extractor is None:
+                return False
+            if not deep:
+                return True
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                return info is not None
+            return self._extract_info(url, flat=True) is not None
                 
         except Exception as e:
             logging.error(f"URL validation error: {str(e)}")
             return False
     
-    def get_video_info(self, url):
-        """Extract video information without downloading"""
-        try:
+    def _match_extractor(self, url):
+        """Find which yt-dlp extractor handles a URL without touching the network
+        
+        Returns the extractor key, 'Generic' when no site-specific extractor
+        matches, or None when the matching extractor is known to be broken.
+        """
+        cache_key = ('extractor', url)
+        cached = self.metadata_cache.get(cache_key)
+        if cached is not None:
+            return cached or None
+        
+        extractor = 'Generic'
+        for ie in self._extractors:
+            if ie.suitable(url):
+                extractor = ie.ie_key() if ie.working() else ''
+                break
+        self.metadata_cache.put(cache_key, extractor)
+        return extractor or None
+    
+    def _extract_info(self, url, flat=False):
+        """Extract metadata for a URL, shared through the metadata cache
+        
+        Callers get their own copy since yt-dlp mutates info dicts while processing.
+        """
+        cache_key = ('flat' if flat else 'full', url)
+        info = self.metadata_cache.get(cache_key)
+        if info is None:
             ydl_opts = {
                 'quiet': True,
                 'no_warnings': True
             }
+            if flat:
+                ydl_opts['extract_flat'] = True
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
-                return {
+                # extract_info already picked formats with the default selector; drop that
+                # selection (requested_formats etc.) so each caller's process_ie_result
+                # chooses from 'formats' with its own selector
+                info = ydl.sanitize_info(info, remove_private_keys=not flat)
+            self.metadata_cache.put(cache_key, info)
+        return copy.deepcopy(info)
+    
+    def get_video_info(self, url):
+        """Extract video information without downloading
+        
+        Along with the basic metadata this lists the source formats and a rough
+        output size and conversion time for every format/option a job could use.
+        Playlists only report their title and size. Results are kept in the
+        metadata cache.
+        """
+        cache_key = ('info', url)
+        cached = self.metadata_cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
+        try:
+            if self._is_playlist(url):
+                playlist = self._playlist_header(url)
+                if not playlist:
+                    return None
+                result = {
+                    'type': 'playlist',
+                    'title': playlist['title'],
+                    'total_count': playlist['total_count'],
+                    'item_limit': self.playlist_max_items
+                }
+            else:
+                info = self._extract_info(url)
+                result = {
+                    'type': 'video',
                     'title': info.get('title', 'Unknown'),
                     'duration': self._format_duration(info.get('duration')),
+                    'duration_seconds': info.get('duration'),
                     'uploader': info.get('uploader', 'Unknown'),
                     'thumbnail': info.get('thumbnail'),
-                    'description': info.get('description', '')
+                    'description': info.get('description', ''),
+                    'formats': self._source_formats(info),
+                    'estimates': self._estimate_outputs(info)
                 }
+            self.metadata_cache.put(cache_key, result)
+            return copy.deepcopy(result)
         except Exception as e:
             logging.error(f"Info extraction error: {str(e)}")
             return None
     
-    def convert(self, url, output_format, quality, job_id, bitrate=None):
-        """Convert media from URL to specified format"""
-        # Initialize job status
-        self.jobs[job_id] = {
-            'status': 'starting',
-            'progress': 0,
-            'error': None,
-            'output_file': None,
-            'urls': [url] if isinstance(url, str) else url,
-            'current_url_index': 0,
-            'total_urls': 1 if isinstance(url, str) else len(url),
-            'playlist_info': None
-        }
+    def get_video_infos(self, urls):
+        """get_video_info for several URLs, extracted in parallel; results keep the input order"""
+        workers = max(1, min(self.info_concurrency, len(urls)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='info') as pool:
+            return list(pool.map(self.get_video_info, urls))
+    
+    def _source_formats(self, info):
+        """The source's downloadable formats with their approximate sizes"""
+        formats = []
+        for fmt in info.get('formats') or [info]:
+            if fmt.get('vcodec') == 'none' and fmt.get('acodec') == 'none':
+                continue  # storyboards and other image-only formats
+            formats.append({
+                'format_id': fmt.get('format_id'),
+                'ext': fmt.get('ext'),
+                'height': fmt.get('height'),
+                'vcodec': fmt.get('vcodec'),
+                'acodec': fmt.get('acodec'),
+                'tbr': fmt.get('tbr'),
+                'filesize': self._format_size(fmt, info.get('duration'))
+            })
+        return formats
+    
+    def _format_size(self, fmt, duration):
+        """Bytes a format will download, from the reported size or its bitrate"""
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('tbr') and duration:
+            size = fmt['tbr'] * 125 * duration
+        return int(size) if size else None
+    
+    def _estimate_outputs(self, info):
+        """Estimated output size and conversion time per format and quality/bitrate option"""
+        estimates = {}
+        # Selection only looks at the format list; leave out thumbnails, captions and
+        # DASH fragment lists so each pass has little to copy
+        formats = [{key: value for key, value in fmt.items() if key != 'fragments'} for fmt in info.get('formats') or []]
+        info = {key: info.get(key) for key in ('id', 'title', 'duration', 'extractor', 'extractor_key', 'webpage_url')}
+        info['formats'] = formats
+        # Many targets share a format string (e.g. every audio bitrate), so select once per string
+        selections = {}
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+            for output_format, options in self.supported_formats.items():
+                preset = self._resolve_preset(output_format)
+                if options['type'] == 'video':
+                    choices = [(quality, None) for quality in ['best'] + options['qualities'] + ['worst']]
+                else:
+                    choices = [('best', bitrate) for bitrate in [None] + options['bitrates']]
+                estimates[output_format] = [
+                    self._estimate_output(ydl, info, output_format, quality, bitrate, preset, selections)
+                    for quality, bitrate in choices
+                ]
+        return estimates
+    
+    def _estimate_output(self, ydl, info, output_format, quality, bitrate=None, preset=None, selections=None):
+        duration = info.get('duration')
+        selected = self._select_formats(ydl, info, output_format, quality, bitrate, selections)
+        sizes = [self._format_size(fmt, duration) for fmt in selected]
+        download_size = sum(sizes) if selected and all(sizes) else None
+        remux = bool(selected) and self._can_remux(self._selected_codecs(selected), output_format, bitrate)
         
-        # Start conversion in background thread to avoid timeout
-        thread = threading.Thread(target=self._convert_async, args=(url, output_format, quality, job_id, bitrate))
-        thread.daemon = True
-        thread.start()
+        if self.supported_formats[output_format]['type'] == 'video':
+            estimate = {'quality': quality}
+        else:
+            estimate = {'bitrate': bitrate}
+        estimate.update(remux=remux, download_size=download_size, size=None, seconds=None)
+        if not duration:
+            return estimate
         
-        return {'success': True, 'job_id': job_id, 'status': 'started'}
+        if remux:
+            estimate['size'] = download_size
+            estimate['seconds'] = round(duration / self.ESTIMATE_REMUX_SPEED, 1)
+            return estimate
+        
+        speed = self.ESTIMATE_ENCODE_SPEED[output_format]
+        if isinstance(speed, dict):
+            speed = speed[preset or 'balanced']
+            height = max((fmt.get('height') or 0 for fmt in selected), default=0) or self._quality_height(quality)
+            kbps = next((rate for bound, rate in self.ESTIMATE_VIDEO_KBPS if height <= bound), self.ESTIMATE_VIDEO_KBPS[-1][1])
+            kbps *= self.ESTIMATE_SIZE_FACTORS[preset or 'balanced'] * self.ESTIMATE_SIZE_FACTORS.get(output_format, 1)
+            if download_size:
+                # Re-encoding a low-bitrate source at a fixed CRF rarely makes it bigger
+                kbps = min(kbps, download_size / 125 / duration)
+        elif bitrate and bitrate.endswith('k'):
+            kbps = int(bitrate[:-1])
+        else:
+            kbps = self.AUDIO_KBPS[output_format] * (1.5 if bitrate == '24bit' else 1)
+        estimate['size'] = int(kbps * 125 * duration)
+        estimate['seconds'] = round(duration / speed, 1)
+        return estimate
     
-    def _convert_async(self, url, output_format, quality, job_id, bitrate=None):
-        """Async conversion process"""
+    def _select_formats(self, ydl, info, output_format, quality, bitrate=None, selections=None):
+        """The format(s) a job would download for a target: one stream, or video and audio to merge
+        
+        selections, if given, memoizes results for this info by format string and sort order.
+        """
+        options = self._format_options(output_format, quality, bitrate)
+        key = (options['format'], tuple(options.get('format_sort', [])))
+        if selections is not None and key in selections:
+            return selections[key]
+        ydl.params['format_sort'] = options.get('format_sort', [])
+        # The selector is compiled when YoutubeDL is created, so swap it directly
+        ydl.format_selector = ydl.build_format_selector(options['format'])
         try:
+            selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+            selected = selected.get('requested_formats') or [selected]
+        except Exception as e:
+            logging.debug(f"Format selection failed: {str(e)}")
+            selected = []
+        if selections is not None:
+            selections[key] = selected
+        return selected
+    
+    def _quality_height(self, quality):
+        if quality in ('best', 'worst'):
+            return 1080 if quality == 'best' else 360
+        return 2160 if quality == '4k' else int(quality.replace('p', ''))
+    
+    def convert(self, url, output_format, quality, job_id, bitrate=None, client_id=None, preset=None,
+                playlist_range=None):
+        """Queue conversion of media from URL to specified format
+        
+        playlist_range is an optional 1-based, inclusive (start, end) pair of
+        playlist positions; end may be None to run to the item limit.
+        """
+        urls = [url] if isinstance(url, str) else url
+        preset = self._resolve_preset(output_format, preset)
+        request_key = json.dumps([urls, output_format, quality, bitrate, preset, playlist_range])
+        
+        with self._lock:
+            # Identical request already queued or running: attach to it
+            for existing_id, existing in self.jobs.items():
+                if existing.get('request_key') == request_key and existing['status'] not in ('completed', 'error'):
+                    existing['subscribers'] += 1
+                    return {'success': True, 'job_id': existing_id, 'status': existing['status']}
             
-            # Handle playlist vs single URL
-            urls_to_process = [url] if isinstance(url, str) else url
-            
-            # Check if it's a playlist
-            if isinstance(url, str) and self._is_playlist(url):
-                playlist_info = self._extract_playlist_info(url)
-                if playlist_info:
-                    urls_to_process = playlist_info['entries']
-                    self.jobs[job_id]['playlist_info'] = playlist_info
-                    self.jobs[job_id]['total_urls'] = len(urls_to_process)
+            # Initialize job status
+            self.jobs[job_id] = {
+                'status': 'queued',
+                'progress': 0,
+                'error': None,
+                'output_file': None,
+                'urls': urls,
+                'current_url_index': 0,
+                'total_urls': len(urls),
+                'playlist_info': None,
+                'preset': preset,
+                # Everything needed to restart the job if this process dies
+                'params': {'url': url, 'output_format': output_format, 'quality': quality, 'bitrate': bitrate,
+                           'preset': preset, 'client_id': client_id, 'playlist_range': playlist_range},
+                'resumes': 0,
+                'stages': {},
+                'request_key': request_key,
+                'subscribers': 1,
+                'cache_hits': 0,
+                'version': 0,
+                'owner': self._owner,
+                'created': time.time(),
+                'updated': time.time()
+            }
+        # Persist before responding; the next /status may land on another worker
+        self._flush([job_id])
+        
+        # Singles jump ahead of batches, batches ahead of playlists
+        if not isinstance(url, str):
+            priority = JobScheduler.PRIORITY_BATCH
+        elif self._is_playlist(url):
+            priority = JobScheduler.PRIORITY_PLAYLIST
+        else:
+            priority = JobScheduler.PRIORITY_SINGLE
+        
+        # Hand off to the worker pools; returns immediately
+        try:
+            self.scheduler.submit(job_id, self._convert_async,
+                                  (url, output_format, quality, job_id, bitrate, preset, playlist_range),
+                                  client_id=client_id, priority=priority)
+        except QueueFullError as e:
+            self._forget(job_id)
+            return {'success': False, 'error': str(e), 'status_code': e.status_code, 'retry_after': e.retry_after}
+        
+        return {'success': True, 'job_id': job_id, 'status': 'queued'}
+    
+    def _resolve_preset(self, output_format, preset=None):
+        """Pick the encoder speed tier for a job, or None if the format has no tiers"""
+        if output_format not in self.ENCODER_PROFILES:
+            return None
+        preset = preset or self.default_preset
+        if preset == 'auto':
+            # Trade quality for throughput once there's more queued than the transcode pool can absorb
+            backlog = self.scheduler.stats()['queued']
+            preset = 'fast' if backlog >= self.scheduler.transcode_workers else 'balanced'
+        if preset not in self.ENCODER_PRESETS:
+            raise ValueError(f"Unsupported preset: {preset}")
+        return preset
+    
+    def _convert_async(self, url, output_format, quality, job_id, bitrate=None, preset=None, playlist_range=None):
+        """Async conversion process"""
+        try:
+            self._update_job(job_id, status='starting')
+            with self._lock:
+                queued_for = time.time() - self.jobs[job_id]['created']
+                client_id = self.jobs[job_id]['params'].get('client_id')
+                # A resumed job keeps the items it already had, including finished ones
+                checkpoint = copy.deepcopy(self.jobs[job_id].get('items')) or []
+                playlist_info = copy.deepcopy(self.jobs[job_id].get('playlist_info'))
+            self.record_stage(job_id, 'queue', queued_for)
             
             # Validate format
             if output_format not in self.supported_formats:
                 error_msg = f"Unsupported format: {output_format}"
-                self.jobs[job_id]['status'] = 'error'
-                self.jobs[job_id]['error'] = error_msg
+                self._update_job(job_id, status='error', error=error_msg)
                 return
             
-            format_info = self.supported_formats[output_format]
+            # Handle playlist vs single URL
+            urls_to_process = [url] if isinstance(url, str) else url
+            
+            # Check if it's a playlist; a resume re-lists it only if listing never finished
+            if checkpoint and not (playlist_info and not playlist_info.get('complete', True)):
+                urls_to_process = [item['url'] for item in checkpoint]
+            elif isinstance(url, str) and self._is_playlist(url):
+                start, end = playlist_range or (None, None)
+                started = time.time()
+                playlist = self._extract_playlist_info(url, start, end)
+                self.record_stage(job_id, 'extract', time.time() - started)
+                if playlist:
+                    urls_to_process = playlist.pop('entries')
+                    playlist_info = dict(playlist, complete=False)
+                    self._update_job(job_id, playlist_info=playlist_info)
+            
+            job_dir = self._job_dir(job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            items = []
             processed_files = []
+            self._update_job(job_id, items=items, failed_count=0)
             
-            # Process each URL
-            for i, current_url in enumerate(urls_to_process):
-                try:
-                    self.jobs[job_id]['current_url_index'] = i
-                    self.jobs[job_id]['status'] = f'processing_{i+1}_of_{len(urls_to_process)}'
-                    
-                    # Create temporary filename
-                    temp_filename = f"{job_id}_temp_{i}"
-                    output_filename = f"{job_id}_output_{i}.{output_format}"
-                    temp_path = os.path.join(self.temp_dir, temp_filename)
-                    output_path = os.path.join(self.temp_dir, output_filename)
-                    
-                    # Update progress
-                    base_progress = (i / len(urls_to_process)) * 80
-                    self.jobs[job_id]['progress'] = base_progress + 10
+            archive_entries = []
+            failed_count = 0
+            zipf = None
+            zip_path = os.path.join(job_dir, f"{job_id}_archive.zip")
+            
+            # Fan items out across a bounded pool so items don't wait on each other;
+            # the downloads themselves still queue for the scheduler's download slots
+            workers = self.item_concurrency
+            if isinstance(urls_to_process, list):
+                workers = max(1, min(workers, len(urls_to_process)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'item-{job_id[:8]}') as pool:
+                # Queue each item as soon as it is listed, so a long playlist starts
+                # downloading while later pages are still being fetched
+                futures = {}
+                for i, current_url in enumerate(urls_to_process):
+                    done = checkpoint[i] if i < len(checkpoint) and checkpoint[i]['url'] == current_url else None
+                    with self._lock:
+                        if done and done['status'] == 'completed' and os.path.exists(done.get('result', {}).get('path', '')):
+                            items.append(done)
+                            processed_files.append(done['result'])
+                        else:
+                            items.append({'url': current_url, 'status': 'pending', 'progress': 0, 'error': None})
+                        self._update_job(
+                            job_id,
+                            total_urls=len(items),
+                            status=f'processing_{min(len(processed_files) + 1, len(items))}_of_{len(items)}'
+                        )
+                    if items[i]['status'] != 'completed':
+                        futures[pool.submit(self._process_item_with_retries, job_id, i, current_url, output_format,
+                                            quality, bitrate, preset)] = i
+                if playlist_info:
+                    playlist_info['complete'] = True
+                    self._update_job(job_id, playlist_info=playlist_info)
+                
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        file_info = future.result()
+                    except Exception as e:
+                        logging.error(f"Error processing URL {i+1}: {str(e)}")
+                        self.metrics.inc('mediaconverter_items_total', status='error')
+                        failed_count += 1
+                        self._update_item(job_id, i, status='error', error=str(e), progress=100)
+                        self._update_job(job_id, failed_count=failed_count)
+                        continue
                     
-                    # Download video/audio using yt-dlp
-                    ydl_opts = {
-                        'outtmpl': temp_path + '.%(ext)s',
-                        'quiet': True,
-                        'no_warnings': True
-                    }
+                    processed_files.append(file_info)
+                    self._update_item(job_id, i, status='completed', progress=100, error=None, result=file_info)
+                    self.limiter.record_bytes(client_id, os.path.getsize(file_info['path']))
+                    # Checkpoint so a restart picks up from here
+                    self._flush([job_id])
                     
-                    # Set quality and format options
-                    if format_info['type'] == 'audio':
-                        ydl_opts['format'] = 'bestaudio/best'
-                        if bitrate:
-                            ydl_opts['postprocessors'] = [{
-                                'key': 'FFmpegAudioConverter',
-                                'preferredcodec': output_format,
-                                'preferredquality': bitrate.replace('k', ''),
-                            }]
+                    # Start archiving as soon as there's more than one result instead
+                    # of waiting for the whole set
+                    if len(processed_files) < 2:
+                        continue
+                    started = time.time()
+                    if self.archive_mode == 'stream':
+                        # Nothing is written now; just checksum each file once for the streamed zip
+                        for earlier in processed_files[len(archive_entries):]:
+                            archive_entries.append(archive_entry(earlier['path'], archive_name(earlier)))
                     else:
-                        if quality == 'best':
-                            ydl_opts['format'] = 'best'
-                        elif quality == 'worst':
-                            ydl_opts['format'] = 'worst'
-                        else:
-                            quality_num = quality.replace('p', '')
-                            ydl_opts['format'] = f'best[height<={quality_num}]'
-                    
-                    # Download the media
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        info = ydl.extract_info(current_url, download=True)
-                        
-                        # Find the downloaded file
-                        downloaded_files = []
-                        for file in os.listdir(self.temp_dir):
-                            if file.startswith(f"{job_id}_temp_{i}"):
-                                downloaded_files.append(os.path.join(self.temp_dir, file))
-                        
-                        if not downloaded_files:
-                            raise Exception(f"Download failed for URL {i+1}")
-                        
-                        input_file = downloaded_files[0]
-                        
-                        # Update progress
-                        self.jobs[job_id]['progress'] = base_progress + 30
-                        
-                        # Convert using FFmpeg if needed
-                        if self._needs_conversion(input_file, output_format):
-                            self._convert_with_ffmpeg(input_file, output_path, output_format, bitrate)
-                        else:
-                            # Just rename/copy the file
-                            os.rename(input_file, output_path)
-                        
-                        # Clean up temporary files
-                        for temp_file in downloaded_files:
-                            if os.path.exists(temp_file) and temp_file != output_path:
-                                os.remove(temp_file)
-                        
-                        processed_files.append({
-                            'path': output_path,
-                            'title': info.get('title', f'Unknown_{i+1}'),
-                            'duration': self._format_duration(info.get('duration'))
-                        })
-                        
-                except Exception as e:
-                    logging.error(f"Error processing URL {i+1}: {str(e)}")
-                    continue
+                        if zipf is None:
+                            zipf = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+                            for earlier in processed_files[:-1]:
+                                self._add_to_archive(zipf, earlier)
+                        self._add_to_archive(zipf, file_info)
+                    self.record_stage(job_id, 'archive', time.time() - started)
+            
+            # Items finished before a resume never went through the loop above
+            started = time.time()
+            if len(processed_files) > 1 and self.archive_mode == 'stream':
+                for earlier in processed_files[len(archive_entries):]:
+                    archive_entries.append(archive_entry(earlier['path'], archive_name(earlier)))
+            elif len(processed_files) > 1 and zipf is None:
+                zipf = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+                for earlier in processed_files:
+                    self._add_to_archive(zipf, earlier)
+            
+            if archive_entries and not ZipStream.supports(archive_entries):
+                # Too big for a plain zip; write a zip64 archive to disk instead
+                zipf = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+                for earlier in processed_files:
+                    self._add_to_archive(zipf, earlier)
+                archive_entries = []
+            
+            if zipf is not None:
+                zipf.close()
+            if len(processed_files) > 1:
+                self.record_stage(job_id, 'archive', time.time() - started)
             
             if not processed_files:
                 raise Exception("No files were successfully processed")
             
-            # If multiple files, create a zip
+            result = {}
+            # If multiple files, serve the zip
             if len(processed_files) > 1:
-                zip_path = self._create_zip_archive(processed_files, job_id)
-                self.jobs[job_id]['output_file'] = zip_path
-                self.jobs[job_id]['file_type'] = 'archive'
+                result['output_file'] = zip_path
+                result['file_type'] = 'archive'
+                result['title'] = f"{len(processed_files)} files"
+                if archive_entries:
+                    result['archive_entries'] = archive_entries
             else:
-                self.jobs[job_id]['output_file'] = processed_files[0]['path']
-                self.jobs[job_id]['file_type'] = 'single'
+                result['output_file'] = processed_files[0]['path']
+                result['file_type'] = 'single'
+                result['title'] = processed_files[0]['title']
+                result['duration'] = processed_files[0]['duration']
+            if failed_count:
+                result['title'] += f" ({failed_count} failed)"
+            
+            # Report how items were produced: remux, transcode, none (already in target format) or cached
+            paths = {item.get('conversion_path') for item in self.jobs[job_id]['items'] if item['status'] == 'completed'}
+            result['conversion_path'] = paths.pop() if len(paths) == 1 else 'mixed'
             
             # Update final status
-            self.jobs[job_id]['status'] = 'completed'
-            self.jobs[job_id]['progress'] = 100
-            self.jobs[job_id]['processed_count'] = len(processed_files)
-            self.jobs[job_id]['title'] = processed_files[0]['title'] if len(processed_files) == 1 else f"{len(processed_files)} files"
+            self._update_job(job_id, status='completed', progress=100, processed_count=len(processed_files), **result)
+            self.metrics.inc('mediaconverter_jobs_total', status='completed')
                 
         except Exception as e:
             error_msg = f"Conversion failed: {str(e)}"
             logging.error(error_msg)
-            self.jobs[job_id]['status'] = 'error'
-            self.jobs[job_id]['error'] = error_msg
+            self._update_job(job_id, status='error', error=error_msg)
+            self.metrics.inc('mediaconverter_jobs_total', status='error')
+        finally:
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job:
+                    self.metrics.observe('mediaconverter_job_duration_seconds', time.time() - job['created'])
+            # Make the final state visible to other workers right away
+            self._flush([job_id])
+    
+    def _process_item_with_retries(self, job_id, i, current_url, output_format, quality, bitrate=None, preset=None):
+        """Run _process_item, retrying transient failures with exponential backoff"""
+        for attempt in range(self.item_retries + 1):
+            try:
+                return self._process_item(job_id, i, current_url, output_format, quality, bitrate, preset)
+            except Exception as e:
+                message = str(e)
+                if attempt == self.item_retries or any(p in message for p in self.PERMANENT_ERRORS):
+                    raise
+                delay = self.retry_backoff * 2 ** attempt * random.uniform(1, 1.5)
+                logging.warning(f"URL {i+1} failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {message}")
+                self.metrics.inc('mediaconverter_item_retries_total')
+                self._update_item(job_id, i, status='retrying', attempts=attempt + 1, error=message)
+                # Stream URLs in cached metadata may be what expired
+                self.metadata_cache.discard(('full', current_url))
+                time.sleep(delay)
+    
+    def _process_item(self, job_id, i, current_url, output_format, quality, bitrate=None, preset=None):
+        """Download and convert a single item of a job"""
+        self._update_item(job_id, i, status='extracting', progress=5)
+        
+        # Create temporary filename
+        temp_filename = f"{job_id}_temp_{i}"
+        output_filename = f"{job_id}_output_{i}.{output_format}"
+        job_dir = self._job_dir(job_id)
+        temp_path = os.path.join(job_dir, temp_filename)
+        output_path = os.path.join(job_dir, output_filename)
+        
+        # Download video/audio using yt-dlp
+        ydl_opts = {
+            'outtmpl': temp_path + '.%(ext)s',
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,  # progress is reported through the hook instead of stderr
+            'progress_hooks': [self._download_hook(job_id, i)],
+            # Pick up .part files left by an earlier attempt instead of starting over
+            'continuedl': True,
+            'retries': 5,
+            'fragment_retries': 10,
+            'concurrent_fragment_downloads': self.fragment_concurrency
+        }
+        
+        # Set quality and format options
+        ydl_opts.update(self._format_options(output_format, quality, bitrate))
+        
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # Deep validation happens here rather than in the request
+            started = time.time()
+            info = self._extract_info(current_url)
+            self.record_stage(job_id, 'extract', time.time() - started)
+            file_info = {
+                'index': i,
+                'path': output_path,
+                'title': info.get('title', f'Unknown_{i+1}'),
+                'duration': self._format_duration(info.get('duration'))
+            }
+            duration = info.get('duration')
+            cache_key = self._cache_key(info, output_format, quality, bitrate, preset)
+            
+            # Serve from cache, or wait for an identical item another job is producing
+            while cache_key:
+                cached = self.cache.get(cache_key)
+                if cached:
+                    link_or_copy(cached[0], output_path)
+                    self._update_item(job_id, i, cached=True, conversion_path='cached')
+                    self.metrics.inc('mediaconverter_items_total', status='cached')
+                    with self._lock:
+                        self._update_job(job_id, cache_hits=self.jobs[job_id]['cache_hits'] + 1)
+                    return file_info
+                in_flight = self.cache.claim(cache_key)
+                if in_flight is None:
+                    break
+                in_flight.wait()
+            
+            try:
+                # Pipe the download straight into FFmpeg when the source allows it
+                source = self._stream_source(ydl, info, output_format) if self.streaming else None
+                if source:
+                    remux = self._can_remux(self._format_codecs(source), output_format, bitrate)
+                    self._update_item(job_id, i, status='streaming', progress=10, pipeline='stream',
+                                      conversion_path='remux' if remux else 'transcode')
+                    try:
+                        # The encode is paced by the network, so this holds a download slot
+                        # rather than one of the CPU-sized transcode pool's threads
+                        with self.scheduler.download_slots:
+                            started = time.time()
+                            self._stream_convert(info, source, temp_path, output_path, output_format, bitrate, remux,
+                                                 self._encode_hook(job_id, i, duration, 10, 90), preset)
+                        # Download and encode overlap, so they're timed as one stage
+                        self.record_stage(job_id, 'stream', time.time() - started)
+                        self.metrics.inc('mediaconverter_downloaded_bytes_total',
+                                         source.get('filesize') or source.get('filesize_approx') or 0)
+                        self.metrics.inc('mediaconverter_items_total', status='completed')
+                        if cache_key:
+                            self.cache.put(cache_key, output_path, {'title': file_info['title'], 'duration': file_info['duration']})
+                        return file_info
+                    except Exception as e:
+                        logging.warning(f"Streaming failed for URL {i+1}, falling back to download: {str(e)}")
+                        if os.path.exists(output_path):
+                            os.remove(output_path)
+                
+                # Download the media, reusing the info we already extracted
+                self._update_item(job_id, i, status='downloading', progress=10, pipeline='download')
+                with self.scheduler.download_slots:
+                    started = time.time()
+                    downloaded = ydl.process_ie_result(info, download=True)
+                self.record_stage(job_id, 'download', time.time() - started)
+                codecs = self._selected_codecs(downloaded.get('requested_formats') or [downloaded])
+                
+                # Find the downloaded file
+                downloaded_files = []
+                for file in os.listdir(job_dir):
+                    if file.startswith(f"{temp_filename}."):
+                        downloaded_files.append(os.path.join(job_dir, file))
+                
+                if not downloaded_files:
+                    raise Exception(f"Download failed for URL {i+1}")
+                
+                input_file = downloaded_files[0]
+                self._update_item(job_id, i, status='converting', progress=50)
+                
+                # Convert using FFmpeg if needed, on the CPU-bound pool
+                started = time.time()
+                if self._needs_conversion(input_file, output_format, bitrate, codecs):
+                    conversion_path = self.scheduler.transcode_pool.submit(
+                        self._convert_with_ffmpeg, input_file, output_path, output_format, bitrate,
+                        self._encode_hook(job_id, i, duration, 50, 50), preset
+                    ).result()
+                else:
+                    # Just rename/copy the file
+                    os.rename(input_file, output_path)
+                    conversion_path = 'none'
+                self.record_stage(job_id, 'transcode', time.time() - started)
+                self._update_item(job_id, i, conversion_path=conversion_path)
+                self.metrics.inc('mediaconverter_items_total', status='completed')
+                
+                # Clean up temporary files
+                for temp_file in downloaded_files:
+                    if os.path.exists(temp_file) and temp_file != output_path:
+                        os.remove(temp_file)
+                
+                if cache_key:
+                    self.cache.put(cache_key, output_path, {'title': file_info['title'], 'duration': file_info['duration']})
+            finally:
+                if cache_key:
+                    self.cache.release(cache_key)
+            
+            return file_info
+    
+    def _cache_key(self, info, output_format, quality, bitrate=None, preset=None):
+        """Build the result cache key for an extracted item, or None if it has no stable id"""
+        if not info or not info.get('id'):
+            return None
+        # Video outputs ignore the audio bitrate. Audio outputs only tell quality 'worst'
+        # (smallest source stream) apart from the rest, so other values share a key
+        if self.supported_formats[output_format]['type'] == 'audio':
+            quality = 'worst' if quality == 'worst' else None
+        else:
+            bitrate = None
+        if preset:
+            # Encoder tiers change the output, so keep them apart; the key format is unchanged without one
+            output_format = f"{output_format}:{preset}"
+        return ResultCache.make_key(info.get('extractor_key', 'generic'), info['id'], output_format, quality, bitrate)
+    
+    def record_stage(self, job_id, stage, seconds):
+        """Add time spent in a pipeline stage to a job's breakdown and the stage histogram
+
+        Items run in parallel, so a job's per-stage figures are totals across its items.
+        """
+        self.metrics.observe('mediaconverter_stage_seconds', seconds, stage=stage)
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job:
+                stages = dict(job.get('stages') or {})
+                stages[stage] = round(stages.get(stage, 0) + seconds, 3)
+                self._update_job(job_id, stages=stages)
+                return
+        # Finished or owned by another worker (e.g. timing a download served here)
+        job = self.store.get(job_id)
+        if job:
+            stages = job.setdefault('stages', {})
+            stages[stage] = round(stages.get(stage, 0) + seconds, 3)
+            job['version'] = job.get('version', 0) + 1
+            self.store.save(job_id, job)
+    
+    def _setup_metrics(self):
+        """Declare metrics and sample scheduler, cache and janitor state at scrape time"""
+        m = self.metrics
+        m.describe('mediaconverter_jobs_total', 'counter', 'Finished jobs by outcome')
+        m.describe('mediaconverter_items_total', 'counter', 'Finished items by outcome (completed, cached, error)')
+        m.describe('mediaconverter_item_retries_total', 'counter', 'Item retries after a failure')
+        m.describe('mediaconverter_downloaded_bytes_total', 'counter', 'Source bytes downloaded')
+        m.describe('mediaconverter_served_bytes_total', 'counter', 'Bytes sent from /download')
+        m.describe('mediaconverter_cache_requests_total', 'counter', 'Cache lookups by cache and result')
+        m.describe('mediaconverter_janitor_reclaimed_bytes_total', 'counter', 'Disk space freed by the janitor')
+        m.describe('mediaconverter_queue_depth', 'gauge', 'Jobs waiting for a download worker')
+        m.describe('mediaconverter_active_jobs', 'gauge', 'Jobs being processed')
+        m.describe('mediaconverter_workers', 'gauge', 'Worker pool sizes')
+        m.describe('mediaconverter_stage_seconds', 'histogram', 'Time spent per pipeline stage')
+        m.describe('mediaconverter_job_duration_seconds', 'histogram', 'Time from queueing to a final state')
+        
+        def collect():
+            stats = self.scheduler.stats()
+            return [
+                ('mediaconverter_queue_depth', {}, stats['queued']),
+                ('mediaconverter_active_jobs', {}, stats['active']),
+                ('mediaconverter_workers', {'pool': 'download'}, stats['download_workers']),
+                ('mediaconverter_workers', {'pool': 'transcode'}, stats['transcode_workers']),
+                ('mediaconverter_cache_requests_total', {'cache': 'result', 'result': 'hit'}, self.cache.hits),
+                ('mediaconverter_cache_requests_total', {'cache': 'result', 'result': 'miss'}, self.cache.misses),
+                ('mediaconverter_cache_requests_total', {'cache': 'metadata', 'result': 'hit'}, self.metadata_cache.hits),
+                ('mediaconverter_cache_requests_total', {'cache': 'metadata', 'result': 'miss'}, self.metadata_cache.misses),
+                ('mediaconverter_janitor_reclaimed_bytes_total', {}, self.janitor.stats['bytes_reclaimed'])
+            ]
+        m.add_collector(collect)
+    
+    def _update_job(self, job_id, **fields):
+        """Update job fields and wake anyone waiting for status changes"""
+        with self._changed:
+            job = self.jobs.get(job_id)
+            if not job:
+                return
+            status_changed = 'status' in fields and fields['status'] != job['status']
+            job.update(fields)
+            job['version'] = job.get('version', 0) + 1
+            job['updated'] = time.time()
+            self._dirty.add(job_id)
+            self._changed.notify_all()
+        if status_changed:
+            self._flush_requested.set()
+        for listener in self._listeners:
+            listener(job_id)
+    
+    def add_listener(self, func):
+        """Call func(job_id) after every change to a job this process runs
+        
+        Listeners are called from worker threads, possibly with the job lock
+        held, so they must return immediately.
+        """
+        self._listeners.append(func)
+    
+    def _flush(self, job_ids=None):
+        """Write dirty jobs (or the given ones) to the job store in one batch"""
+        with self._lock:
+            ids = set(self._dirty) if job_ids is None else set(job_ids)
+            self._dirty -= ids
+            snapshots = {jid: copy.deepcopy(self.jobs[jid]) for jid in ids if jid in self.jobs}
+        if not snapshots:
+            return
+        try:
+            self.store.save_many(snapshots)
+        except Exception as e:
+            logging.error(f"Job store write error: {str(e)}")
+            with self._lock:
+                self._dirty |= set(snapshots)
+    
+    def _flush_loop(self):
+        # Progress changes many times a second; batching keeps the store off the hot path.
+        # Status transitions wake the loop early so they show up promptly elsewhere.
+        while True:
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            self._flush()
     
-    def _needs_conversion(self, input_file, target_format):
+    def _job_dir(self, job_id):
+        """Working directory for a job's downloads, outputs and archive"""
+        return os.path.join(self.work_root, job_id)
+    
+    def _remove_job_files(self, job_id, job=None):
+        """Delete a job's working directory; returns (bytes freed, files removed)"""
+        reclaimed, files = remove_path(self._job_dir(job_id))
+        # Jobs from before per-job directories kept their output directly in the temp dir
+        output_file = (job or {}).get('output_file')
+        if output_file and os.path.dirname(output_file) != self._job_dir(job_id):
+            freed, removed = remove_path(output_file)
+            reclaimed += freed
+            files += removed
+        return reclaimed, files
+    
+    def list_jobs(self, include_shared=True):
+        """Get {job_id: job} for this process's jobs, plus the shared store's if include_shared"""
+        jobs = self.store.all() if include_shared else {}
+        with self._lock:
+            jobs.update(copy.deepcopy(self.jobs))
+        return jobs
+    
+    def expire_job(self, job_id):
+        """Remove a job and its files regardless of subscribers; returns (bytes freed, files removed)"""
+        job = self._lookup_job(job_id)
+        self.scheduler.cancel(job_id)
+        reclaimed, files = self._remove_job_files(job_id, job)
+        self._forget(job_id)
+        return reclaimed, files
+    
+    def _forget(self, job_id):
+        """Drop a job from this process and the shared store"""
+        with self._lock:
+            self.jobs.pop(job_id, None)
+            self._dirty.discard(job_id)
+        self.store.delete(job_id)
+    
+    def _recover_orphaned_jobs(self):
+        """Resume jobs left unfinished by a process on this host that no longer exists"""
+        host = socket.gethostname()
+        for job_id, job in self.store.all().items():
+            if job.get('status') in ('completed', 'error'):
+                continue
+            previous_owner = job.get('owner') or ''
+            owner_host, _, pid = previous_owner.rpartition(':')
+            if owner_host != host or not pid.isdigit() or self._process_alive(int(pid)):
+                continue
+            
+            params = job.get('params')
+            if not params or job.get('resumes', 0) >= self.max_resumes:
+                job.update(status='error', error='Conversion interrupted by a server restart')
+            else:
+                job.update(status='queued', owner=self._owner, resumes=job.get('resumes', 0) + 1)
+            job.update(version=job.get('version', 0) + 1, updated=time.time())
+            
+            # Several workers start at once; only the one that swaps the owner adopts the job
+            if not self.store.claim(job_id, previous_owner, job):
+                continue
+            if job['status'] == 'error':
+                logging.warning(f"Marked interrupted job {job_id} as failed")
+                continue
+            
+            logging.warning(f"Resuming interrupted job {job_id}")
+            with self._lock:
+                self.jobs[job_id] = job
+            try:
+                self.scheduler.submit(job_id, self._convert_async,
+                                      (params['url'], params['output_format'], params['quality'], job_id,
+                                       params['bitrate'], params['preset'], params.get('playlist_range')),
+                                      client_id=params.get('client_id'), priority=JobScheduler.PRIORITY_PLAYLIST)
+            except QueueFullError as e:
+                self._update_job(job_id, status='error', error=f"Could not resume: {str(e)}")
+                self._flush([job_id])
+    
+    def _process_alive(self, pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+    
+    def _update_item(self, job_id, index, **fields):
+        """Update one item of a job and roll its progress up into the job"""
+        with self._changed:
+            job = self.jobs.get(job_id)
+            if not job:
+                return
+            items = job['items']
+            items[index].update(fields)
+            
+            # Leave the last 10% for archiving/finalizing
+            done = sum(1 for item in items if item['status'] in ('completed', 'error'))
+            active = [item for item in items if item['status'] == 'downloading']
+            self._update_job(
+                job_id,
+                progress=round(sum(item['progress'] for item in items) / len(items) * 0.9, 1),
+                current_url_index=done,
+                status=f'processing_{min(done + 1, len(items))}_of_{len(items)}',
+                speed=sum(item.get('speed') or 0 for item in active) or None,
+                eta=max((item.get('eta') or 0 for item in active), default=0) or None
+            )
+    
+    def _download_hook(self, job_id, index):
+        """Build a yt-dlp progress hook that reports bytes, speed and ETA for one item"""
+        last_report = [0]
+        
+        def hook(d):
+            now = time.time()
+            # yt-dlp calls this for every chunk; twice a second is plenty
+            if d['status'] == 'downloading' and now - last_report[0] < 0.5:
+                return
+            last_report[0] = now
+            
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            downloaded = d.get('downloaded_bytes') or 0
+            if d['status'] == 'finished':
+                self.metrics.inc('mediaconverter_downloaded_bytes_total', downloaded)
+            fraction = min(downloaded / total, 1) if total else 0
+            # Downloading spans 10-50% of an item, converting the rest
+            self._update_item(job_id, index, progress=round(10 + 40 * fraction, 1), downloaded_bytes=downloaded,
+                              total_bytes=total, speed=d.get('speed'), eta=d.get('eta'))
+        return hook
+    
+    def _encode_hook(self, job_id, index, duration, start, span):
+        """Build an FFmpeg progress callback mapping encoded time onto start..start+span percent"""
+        def hook(seconds, speed):
+            fraction = min(seconds / duration, 1) if duration else 0
+            self._update_item(job_id, index, progress=round(start + span * fraction, 1), encode_speed=speed)
+        return hook
+    
+    def _needs_conversion(self, input_file, target_format, bitrate=None, codecs=None):
         """Check if file needs format conversion"""
         file_ext = os.path.splitext(input_file)[1].lower().lstrip('.')
-        return file_ext != target_format
+        # A requested bitrate/bit depth has to be applied even when the container matches
+        if file_ext != target_format or bitrate:
+            return True
+        # Right container, but yt-dlp may have merged codecs the target shouldn't carry
+        return codecs is not None and not self._can_remux(codecs, target_format)
+    
+    def _selected_codecs(self, formats):
+        """Combined codecs of the format(s) yt-dlp picked, or None if any are unknown"""
+        codecs = {'video': [], 'audio': []}
+        for fmt in formats:
+            found = self._format_codecs(fmt)
+            if found is None:
+                return None
+            codecs['video'] += found['video']
+            codecs['audio'] += found['audio']
+        return codecs
     
-    def _convert_with_ffmpeg(self, input_file, output_file, output_format, bitrate=None):
-        """Convert file using FFmpeg"""
+    def _format_options(self, output_format, quality, bitrate=None):
+        """yt-dlp format options that pick the smallest streams satisfying a target
+        
+        Audio targets only fetch an audio stream. Video targets fetch separate
+        video and audio streams for yt-dlp to merge, falling back to a muxed
+        stream. Streams the target container can hold as-is come first so
+        FFmpeg can be skipped, and at equal resolution the smaller file wins.
+        """
+        format_info = self.supported_formats[output_format]
+        codecs = self.CONTAINER_CODECS[output_format]
+        acopy = self._codec_filter('acodec', codecs['audio'])
+        
+        if format_info['type'] == 'audio':
+            if quality == 'worst':
+                return {'format': f'wa{acopy}/wa/w'}
+            # When re-encoding to a lossy bitrate, the smallest stream at or above it is enough
+            kbps = bitrate[:-1] if bitrate and bitrate.endswith('k') else None
+            if not bitrate and output_format in ('mp3', 'aac', 'm4a'):
+                kbps = self.AUDIO_KBPS[output_format]
+            minimum = f'wa[abr>={kbps}]/' if kbps else ''
+            # A requested bitrate forces a re-encode, so there's no point preferring copyable codecs
+            return {'format': f'{minimum}ba/b' if bitrate else f'ba{acopy}/{minimum}ba/b'}
+        
+        vcopy = self._codec_filter('vcodec', codecs['video'])
+        # Merge into the target container when the streams allow it, otherwise MKV for FFmpeg to convert
+        options = {'merge_output_format': output_format if output_format == 'mkv' else f'{output_format}/mkv'}
+        if quality == 'worst':
+            options['format'] = f'wv{vcopy}+wa{acopy}/wv+wa/w'
+            return options
+        
+        limit = ''
+        if quality != 'best':
+            height = self._quality_height(quality)
+            limit = f'[height<=?{height}]'  # ? keeps formats with unknown height
+            # Closest resolution at or under the limit, then the best audio, then the smallest file
+            options['format_sort'] = [f'res:{height}', 'abr', '+size']
+        options['format'] = f'bv{limit}{vcopy}+ba{acopy}/b{limit}[ext={output_format}]/bv{limit}+ba/b{limit}/bv+ba/b'
+        return options
+    
+    def _codec_filter(self, field, accepted):
+        """A yt-dlp filter matching the codecs a container accepts, e.g. [acodec~='^(mp4a|aac)']"""
+        prefixes = [prefix for prefix, name in self.CODEC_ALIASES if accepted and name in accepted]
+        if not prefixes:
+            return ''
+        return f"[{field}~='^({'|'.join(prefixes)})']"
+    
+    def _normalize_codec(self, codec):
+        """Map a yt-dlp codec string (e.g. avc1.64001F, mp4a.40.2) to an FFmpeg codec name"""
+        if not codec or codec == 'none':
+            return None
+        codec = codec.lower()
+        for prefix, name in self.CODEC_ALIASES:
+            if codec.startswith(prefix):
+                return name
+        return codec
+    
+    def _format_codecs(self, fmt):
+        """Codecs of a yt-dlp format, or None when the extractor didn't report them"""
+        vcodec, acodec = fmt.get('vcodec'), fmt.get('acodec')
+        if vcodec is None or acodec is None:
+            return None
+        return {
+            'video': [c for c in [self._normalize_codec(vcodec)] if c],
+            'audio': [c for c in [self._normalize_codec(acodec)] if c]
+        }
+    
+    def _probe_codecs(self, input_file):
+        """Read stream codecs with ffprobe; None if probing isn't possible"""
         try:
-            cmd = ['ffmpeg', '-i', input_file, '-y']  # -y to overwrite output file
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-show_entries', 'stream=codec_type,codec_name', '-of', 'json', input_file],
+                capture_output=True, text=True, timeout=60
+            )
+            if result.returncode != 0:
+                return None
+            streams = json.loads(result.stdout).get('streams', [])
+        except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+            logging.debug(f"ffprobe failed: {str(e)}")
+            return None
+        
+        codecs = {'video': [], 'audio': []}
+        for stream in streams:
+            if stream.get('codec_type') in codecs:
+                codecs[stream['codec_type']].append(stream.get('codec_name'))
+        return codecs
+    
+    def _can_remux(self, codecs, output_format, bitrate=None):
+        """Decide whether the source codecs can be copied into the target container as-is"""
+        if not codecs:
+            return False
+        allowed = self.CONTAINER_CODECS.get(output_format)
+        if output_format == 'wav':
+            allowed = {'audio': {'pcm_s24le' if bitrate == '24bit' else 'pcm_s16le'}}
+        elif bitrate or not allowed:
+            # Changing the bitrate always means re-encoding
+            return False
+        
+        def fits(found, accepted):
+            return accepted is None or all(codec in accepted for codec in found)
+        
+        if self.supported_formats[output_format]['type'] == 'audio':
+            # Only the first audio stream is kept, so video/cover art doesn't matter
+            return bool(codecs['audio']) and fits(codecs['audio'][:1], allowed['audio'])
+        return (bool(codecs['video']) and fits(codecs['video'], allowed['video'])
+                and fits(codecs['audio'], allowed['audio']))
+    
+    def _stream_source(self, ydl, info, output_format):
+        """Pick the format to stream into FFmpeg, or None if this item must be downloaded first"""
+        try:
+            selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        except Exception as e:
+            logging.debug(f"Format selection for streaming failed: {str(e)}")
+            return None
+        
+        # Merged video+audio downloads need both streams on disk
+        if not selected or selected.get('requested_formats') or not selected.get('format_id'):
+            return None
+        
+        ext = selected.get('ext')
+        protocol = selected.get('protocol', '')
+        if ext == output_format:
+            # Nothing to convert, a plain download is cheaper
+            return None
+        if protocol.startswith('m3u8') or protocol == 'http_dash_segments':
+            return selected
+        if protocol not in ('http', 'https'):
+            return None
+        # FFmpeg can't seek a pipe, so progressive MP4/M4A (index at the end) can't be streamed
+        if ext in self.STREAMABLE_EXTS or (selected.get('container') or '').endswith('_dash'):
+            return selected
+        return None
+    
+    def _stream_convert(self, info, source, temp_path, output_file, output_format, bitrate=None, remux=False,
+                        on_progress=None, preset=None):
+        """Download with yt-dlp and encode with FFmpeg concurrently through a pipe"""
+        info_path = temp_path + '.info.json'
+        with open(info_path, 'w') as f:
+            json.dump(info, f)
+        
+        download_cmd = [
+            sys.executable, '-m', 'yt_dlp', '--quiet', '--no-warnings',
+            '--load-info-json', info_path, '-f', source['format_id'], '-o', '-',
+            '--retries', '5', '--fragment-retries', '10', '--concurrent-fragments', str(self.fragment_concurrency)
+        ]
+        downloader = None
+        try:
+            downloader = subprocess.Popen(download_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            cmd = self._ffmpeg_command('pipe:0', output_file, output_format, bitrate, remux, preset)
+            returncode, encode_error = self._run_ffmpeg(cmd, on_progress, stdin=downloader.stdout, timeout=None,
+                                                        stall_timeout=self.stream_stall_timeout)
+            download_error = downloader.stderr.read().decode('utf-8', 'replace')
+            downloader.wait(timeout=30)
             
-            if output_format == 'mp3':
-                cmd.extend(['-acodec', 'libmp3lame'])
-                if bitrate:
-                    cmd.extend(['-ab', bitrate])
-                else:
-                    cmd.extend(['-ab', '192k'])
-            elif output_format == 'wav':
-                if bitrate == '24bit':
-                    cmd.extend(['-acodec', 'pcm_s24le'])
-                else:
-                    cmd.extend(['-acodec', 'pcm_s16le'])
-            elif output_format == 'aac':
-                cmd.extend(['-acodec', 'aac'])
-                if bitrate:
-                    cmd.extend(['-ab', bitrate])
-                else:
-                    cmd.extend(['-ab', '128k'])
-            elif output_format == 'm4a':
-                cmd.extend(['-acodec', 'aac'])
-                if bitrate:
-                    cmd.extend(['-ab', bitrate])
-                else:
-                    cmd.extend(['-ab', '128k'])
-            elif output_format == 'flac':
-                cmd.extend(['-acodec', 'flac'])
-            elif output_format == 'mp4':
-                cmd.extend(['-vcodec', 'libx264', '-acodec', 'aac'])
-                cmd.extend(['-preset', 'medium', '-crf', '23'])
-            elif output_format == 'webm':
-                cmd.extend(['-vcodec', 'libvpx-vp9', '-acodec', 'libopus'])
-            elif output_format == 'mkv':
-                cmd.extend(['-vcodec', 'libx264', '-acodec', 'aac'])
+            if downloader.returncode != 0:
+                raise Exception(f"yt-dlp error: {download_error}")
+            if returncode != 0:
+                raise Exception(f"FFmpeg error: {encode_error}")
+        except subprocess.TimeoutExpired:
+            raise Exception("Conversion timeout")
+        finally:
+            if downloader and downloader.poll() is None:
+                downloader.kill()
+                downloader.wait()
+            if os.path.exists(info_path):
+                os.remove(info_path)
+    
+    def _run_ffmpeg(self, cmd, on_progress=None, stdin=None, timeout=600, stall_timeout=None):
+        """Run FFmpeg, passing (seconds encoded, speed) from its -progress output to on_progress
+        
+        If stdin is a pipe from another process, our copy is closed once FFmpeg has
+        it so the writer sees a broken pipe if FFmpeg exits early. FFmpeg is killed
+        after timeout seconds in total, or after stall_timeout seconds in which the
+        encoded position doesn't move (e.g. its input stopped arriving); either
+        may be None. Returns (returncode, stderr) and raises subprocess.TimeoutExpired
+        when it was killed.
+        """
+        cmd = cmd[:1] + ['-progress', 'pipe:1', '-nostats'] + cmd[1:]
+        # Encodes (the commands given a -threads share) count towards how later ones split the cores
+        encode = '-threads' in cmd
+        started = time.time()
+        last_progress = [started]
+        timed_out = threading.Event()
+        finished = threading.Event()
+        
+        def watchdog():
+            while not finished.wait(1):
+                now = time.time()
+                if (timeout and now - started >= timeout) or (stall_timeout and now - last_progress[0] >= stall_timeout):
+                    timed_out.set()
+                    process.kill()
+                    return
+        
+        # stderr goes to a file so a chatty FFmpeg can't block on a full pipe while we read stdout
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr, text=True)
+            if stdin is not None:
+                stdin.close()
+            timer = threading.Thread(target=watchdog, name='ffmpeg-watchdog')
+            timer.daemon = True
+            timer.start()
+            if encode:
+                with self._lock:
+                    self._running_encodes += 1
+            try:
+                seconds, speed = 0, None
+                for line in process.stdout:
+                    key, _, value = line.strip().partition('=')
+                    if key == 'out_time_us' and value.isdigit():
+                        # Reports keep coming while FFmpeg waits on input, so only a moving clock counts
+                        if int(value) / 1000000 > seconds:
+                            last_progress[0] = time.time()
+                        seconds = int(value) / 1000000
+                    elif key == 'speed':
+                        speed = value
+                    elif key == 'progress' and on_progress:
+                        on_progress(seconds, speed)
+                process.wait()
+            finally:
+                finished.set()
+                if encode:
+                    with self._lock:
+                        self._running_encodes -= 1
             
-            cmd.append(output_file)
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(cmd, time.time() - started)
+            stderr.seek(0)
+            return process.returncode, stderr.read().decode('utf-8', 'replace')
+    
+    def _convert_with_ffmpeg(self, input_file, output_file, output_format, bitrate=None, on_progress=None, preset=None):
+        """Convert file using FFmpeg; returns 'remux' or 'transcode' depending on the path taken"""
+        try:
+            # Copying streams is near-instant compared to re-encoding, so try it first
+            if self._can_remux(self._probe_codecs(input_file), output_format, bitrate):
+                cmd = self._ffmpeg_command(input_file, output_file, output_format, bitrate, remux=True)
+                returncode, error = self._run_ffmpeg(cmd, on_progress)
+                if returncode == 0:
+                    return 'remux'
+                logging.warning(f"Remux failed, re-encoding instead: {error[-500:]}")
+            
+            cmd = self._ffmpeg_command(input_file, output_file, output_format, bitrate, preset=preset)
             
             # Run FFmpeg with longer timeout for batch processing
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+            returncode, error = self._run_ffmpeg(cmd, on_progress)
             
-            if result.returncode != 0:
-                raise Exception(f"FFmpeg error: {result.stderr}")
+            if returncode != 0:
+                raise Exception(f"FFmpeg error: {error}")
+            return 'transcode'
                 
         except subprocess.TimeoutExpired:
             raise Exception("Conversion timeout")
         except Exception as e:
             raise Exception(f"FFmpeg conversion failed: {str(e)}")
     
+    def _ffmpeg_command(self, input_file, output_file, output_format, bitrate=None, remux=False, preset=None):
+        """Build the FFmpeg command line for a target format"""
+        cmd = ['ffmpeg', '-i', input_file, '-y']  # -y to overwrite output file
+        
+        if remux:
+            if self.supported_formats[output_format]['type'] == 'audio':
+                cmd.extend(['-map', '0:a:0', '-c', 'copy'])
+            else:
+                cmd.extend(['-map', '0:v', '-map', '0:a?', '-c', 'copy'])
+            if output_format in ('mp4', 'm4a'):
+                # Index up front so players can start before the download completes
+                cmd.extend(['-movflags', '+faststart'])
+            cmd.append(output_file)
+            return cmd
+        
+        if output_format == 'mp3':
+            cmd.extend(['-acodec', 'libmp3lame'])
+            if bitrate:
+                cmd.extend(['-ab', bitrate])
+            else:
+                cmd.extend(['-ab', '192k'])
+        elif output_format == 'wav':
+            if bitrate == '24bit':
+                cmd.extend(['-acodec', 'pcm_s24le'])
+            else:
+                cmd.extend(['-acodec', 'pcm_s16le'])
+        elif output_format == 'aac':
+            cmd.extend(['-acodec', 'aac'])
+            if bitrate:
+                cmd.extend(['-ab', bitrate])
+            else:
+                cmd.extend(['-ab', '128k'])
+        elif output_format == 'm4a':
+            cmd.extend(['-acodec', 'aac'])
+            if bitrate:
+                cmd.extend(['-ab', bitrate])
+            else:
+                cmd.extend(['-ab', '128k'])
+        elif output_format == 'flac':
+            cmd.extend(['-acodec', 'flac'])
+        elif output_format == 'mp4':
+            cmd.extend(['-vcodec', 'libx264', '-acodec', 'aac'])
+        elif output_format == 'webm':
+            cmd.extend(['-vcodec', 'libvpx-vp9', '-acodec', 'libopus'])
+        elif output_format == 'mkv':
+            cmd.extend(['-vcodec', 'libx264', '-acodec', 'aac'])
+        
+        profiles = self.ENCODER_PROFILES.get(output_format)
+        if profiles:
+            cmd.extend(profiles[preset or 'balanced'])
+        cmd.extend(['-threads', str(self._encode_threads())])
+        cmd.append(output_file)
+        return cmd
+    
+    def _encode_threads(self):
+        """Threads for an encode starting now: an even share of the cores with the encodes already running
+        
+        A lone encode on an idle box gets every core; under load each new one
+        gets fewer, so concurrent encodes don't oversubscribe the CPU.
+        """
+        if self.ffmpeg_threads:
+            return self.ffmpeg_threads
+        with self._lock:
+            running = self._running_encodes
+        return max(1, (os.cpu_count() or 1) // (running + 1))
+    
     def _is_playlist(self, url):
         """Check if URL is a playlist"""
         playlist_indicators = [
@@ -288,57 +1391,92 @@ class MediaConverter:
         ]
         return any(indicator in url.lower() for indicator in playlist_indicators)
     
-    def _extract_playlist_info(self, url):
-        """Extract playlist information"""
+    def _extract_playlist_info(self, url, start=None, end=None):
+        """Extract playlist information
+        
+        'entries' is a generator of item URLs for positions start..end (1-based,
+        inclusive, capped at playlist_max_items). Only the first page is fetched
+        here; later pages are requested as the generator is consumed.
+        """
+        start = max(1, start or 1)
+        last = start + self.playlist_max_items - 1
+        end = min(end, last) if end else last
         try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': True
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if 'entries' in info:
-                    entries = []
-                    for entry in info['entries']:
-                        if entry and 'url' in entry:
-                            entries.append(entry['url'])
-                        elif entry and 'id' in entry:
-                            # Construct URL for platforms like YouTube
-                            if 'youtube' in url:
-                                entries.append(f"https://www.youtube.com/watch?v={entry['id']}")
-                    
-                    return {
-                        'title': info.get('title', 'Playlist'),
-                        'entries': entries[:50],  # Limit to 50 for performance
-                        'total_count': len(entries)
-                    }
+            opened = self._open_playlist(url)
         except Exception as e:
             logging.error(f"Playlist extraction error: {str(e)}")
-        return None
-    
-    def _create_zip_archive(self, files, job_id):
-        """Create zip archive of multiple files"""
-        import zipfile
-        
-        zip_path = os.path.join(self.temp_dir, f"{job_id}_archive.zip")
+            return None
+        if not opened:
+            return None
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for i, file_info in enumerate(files):
-                if os.path.exists(file_info['path']):
-                    # Use a clean filename
-                    clean_title = re.sub(r'[^\w\s-]', '', file_info['title'])
-                    ext = os.path.splitext(file_info['path'])[1]
-                    archive_name = f"{i+1:03d}_{clean_title[:50]}{ext}"
-                    zipf.write(file_info['path'], archive_name)
+        ydl, info, header = opened
+        return dict(header, entries=self._iter_playlist_entries(ydl, url, info['entries'], start, end),
+                    start=start, end=end)
+    
+    def _playlist_header(self, url):
+        """Title and item count of a playlist, shared through the metadata cache"""
+        cache_key = ('playlist', url)
+        header = self.metadata_cache.get(cache_key)
+        if header is None:
+            opened = self._open_playlist(url)
+            if not opened:
+                return None
+            ydl, _, header = opened
+            ydl.close()
+        return dict(header)
+    
+    def _open_playlist(self, url):
+        """Fetch the first page of a playlist without expanding its items
         
-        # Clean up individual files
-        for file_info in files:
-            if os.path.exists(file_info['path']):
-                os.remove(file_info['path'])
+        Returns (ydl, info, header), or None if url isn't a playlist. ydl is left
+        open so info['entries'] can fetch later pages; the caller must close it.
+        The header (title and item count) is stored in the metadata cache.
+        """
+        ydl = yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'extract_flat': 'in_playlist'})
+        try:
+            # process=False leaves 'entries' as the extractor's lazy iterator instead of a full list
+            info = ydl.extract_info(url, download=False, process=False)
+            for _ in range(3):
+                if not info or info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+        except Exception:
+            ydl.close()
+            raise
+        if not info or 'entries' not in info:
+            ydl.close()
+            return None
         
-        return zip_path
+        header = {'title': info.get('title', 'Playlist'), 'total_count': info.get('playlist_count')}
+        self.metadata_cache.put(('playlist', url), header)
+        return ydl, info, header
+    
+    def _iter_playlist_entries(self, ydl, url, entries, start, end):
+        """Yield item URLs from a flat playlist's entries for positions start..end"""
+        try:
+            if hasattr(entries, 'getslice'):
+                # Paged playlists only fetch the pages that cover the slice
+                entries = entries.getslice(start - 1, end)
+            else:
+                entries = itertools.islice(entries, start - 1, end)
+            for entry in entries:
+                if entry and entry.get('url'):
+                    yield entry['url']
+                elif entry and entry.get('id'):
+                    # Construct URL for platforms like YouTube
+                    if 'youtube' in url:
+                        yield f"https://www.youtube.com/watch?v={entry['id']}"
+        except Exception as e:
+            # Keep whatever was listed before the failure
+            logging.error(f"Playlist extraction error: {str(e)}")
+        finally:
+            ydl.close()
+    
+    def _add_to_archive(self, zipf, file_info):
+        """Write a processed file into an open zip archive and remove the original"""
+        if os.path.exists(file_info['path']):
+            add_to_zip(zipf, file_info['path'], archive_name(file_info))
+            os.remove(file_info['path'])
     
     def get_supported_formats(self):
         """Get list of supported formats with their options"""
@@ -352,23 +1490,88 @@ class MediaConverter:
     
     def get_status(self, job_id):
         """Get job status"""
-        return self.jobs.get(job_id, {'status': 'not_found', 'error': 'Job not found'})
+        status = self._lookup_job(job_id)
+        if not status:
+            return {'status': 'not_found', 'error': 'Job not found'}
+        
+        # Anyone attached to the job can read this, so leave out who submitted it
+        if status.get('params'):
+            status['params'] = {key: value for key, value in status['params'].items() if key != 'client_id'}
+        if status['status'] == 'queued':
+            queue_info = self.scheduler.queue_info(job_id)
+            if queue_info:
+                status.update(queue_info)
+        return status
+    
+    def _lookup_job(self, job_id):
+        """Get a copy of a job from this process, falling back to the shared store"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return copy.deepcopy(job)
+        # Owned by another worker process, or left over from before a restart
+        return self.store.get(job_id)
+    
+    def wait_for_update(self, job_id, since_version=-1, timeout=25):
+        """Block until a job changes past since_version; returns its status, or None on timeout"""
+        if job_id not in self.jobs:
+            # Another worker owns it, so all we can do is watch the store
+            deadline = time.time() + timeout
+            while True:
+                status = self.get_status(job_id)
+                if status['status'] == 'not_found' or status.get('version', 0) > since_version:
+                    return status
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                time.sleep(min(self.flush_interval, remaining))
+        
+        with self._changed:
+            changed = self._changed.wait_for(
+                lambda: job_id not in self.jobs or self.jobs[job_id].get('version', 0) > since_version,
+                timeout=timeout
+            )
+        if not changed:
+            return None
+        return self.get_status(job_id)
     
     def get_output_file(self, job_id):
         """Get output file path for job"""
-        job = self.jobs.get(job_id)
+        job = self._lookup_job(job_id)
         if job and job.get('output_file'):
             return job['output_file']
         return None
     
+    def get_archive(self, job_id):
+        """Get a ZipStream for a job whose archive is generated at download time, or None"""
+        job = self._lookup_job(job_id)
+        entries = job.get('archive_entries') if job else None
+        if not entries or not all(os.path.exists(entry['path']) for entry in entries):
+            return None
+        return ZipStream(entries)
+    
     def cleanup_file(self, job_id):
         """Clean up files for a job"""
-        job = self.jobs.get(job_id)
-        if job and job.get('output_file'):
+        with self._lock:
+            local = job_id in self.jobs
+            job = self.jobs[job_id] if local else self.store.get(job_id)
+            if not job:
+                return
+            # Other clients attached to the same job still need its output
+            job['subscribers'] = job.get('subscribers', 1) - 1
+            if job['subscribers'] > 0:
+                if local:
+                    self._dirty.add(job_id)
+                else:
+                    self.store.save(job_id, job)
+                return
+        if local and self.scheduler.cancel(job_id):
+            self._forget(job_id)
+            return
+        if job.get('output_file'):
             try:
-                if os.path.exists(job['output_file']):
-                    os.remove(job['output_file'])
-                del self.jobs[job_id]
+                self._remove_job_files(job_id, job)
+                self._forget(job_id)
             except Exception as e:
                 logging.error(f"Cleanup error: {str(e)}")
     
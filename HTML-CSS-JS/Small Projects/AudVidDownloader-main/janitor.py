@@ -0,0 +1,150 @@
+import os
+import re
+import fcntl
+import shutil
+import logging
+import tempfile
+import threading
+import time
+
+
+class Janitor:
+    """Background sweeper that expires finished jobs and reclaims temp disk space"""
+
+    # Files from before per-job working directories: <uuid>_temp_N.*, <uuid>_output_N.*, <uuid>_archive.zip
+    LEGACY_FILE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_(temp_|output_|archive)')
+
+    def __init__(self, converter, interval=None):
+        self.converter = converter
+        self.interval = interval or int(os.environ.get('MEDIA_JANITOR_INTERVAL', 60))
+        # Seconds since a job's last update before it is removed, per state
+        self.ttls = {
+            'completed': int(os.environ.get('MEDIA_TTL_COMPLETED', 3600)),
+            'error': int(os.environ.get('MEDIA_TTL_ERROR', 900)),
+            'active': int(os.environ.get('MEDIA_TTL_ACTIVE', 6 * 3600))
+        }
+        self.high_watermark = float(os.environ.get('MEDIA_DISK_HIGH_WATERMARK', 0.9))
+        self.low_watermark = self.high_watermark - 0.05
+        # Leave brand-new directories alone; their job may not be in the store yet
+        self.orphan_grace = 300
+        self.stats = {'runs': 0, 'jobs_expired': 0, 'files_removed': 0, 'bytes_reclaimed': 0, 'last_run': None}
+        self._lock_path = os.path.join(converter.work_root, '.janitor.lock')
+        self._lock_file = None
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name='janitor')
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
+        # Clear out whatever a previous process left behind before settling into the loop
+        if self._acquire_leader():
+            self.sweep_orphans(include_legacy=True)
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logging.error(f"Janitor error: {str(e)}")
+            time.sleep(self.interval)
+
+    def _acquire_leader(self):
+        """Only one process per host sweeps shared disk and the shared store"""
+        if self._lock_file:
+            return True
+        lock_file = open(self._lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def run_once(self):
+        """Expire jobs past their TTL, then evict outputs if the disk is too full"""
+        leader = self._acquire_leader()
+        now = time.time()
+        # Every process prunes its own in-memory jobs; the leader also handles other workers' jobs
+        jobs = self.converter.list_jobs(include_shared=leader)
+
+        for job_id, job in jobs.items():
+            status = job.get('status')
+            ttl = self.ttls.get(status, self.ttls['active'])
+            if now - job.get('updated', job.get('created', 0)) > ttl:
+                self._expire(job_id)
+
+        if leader:
+            self._enforce_watermark(jobs)
+            self.sweep_orphans()
+
+        self.stats['runs'] += 1
+        self.stats['last_run'] = now
+
+    def sweep_orphans(self, include_legacy=False):
+        """Remove working directories (and old-style temp files) that no job refers to"""
+        known = set(self.converter.list_jobs(include_shared=True))
+        cutoff = time.time() - self.orphan_grace
+        work_root = self.converter.work_root
+
+        for name in os.listdir(work_root):
+            path = os.path.join(work_root, name)
+            if name in known or not os.path.isdir(path) or os.path.getmtime(path) > cutoff:
+                continue
+            self._reclaim(path)
+
+        if include_legacy:
+            temp_dir = tempfile.gettempdir()
+            for name in os.listdir(temp_dir):
+                path = os.path.join(temp_dir, name)
+                if self.LEGACY_FILE.match(name) and name[:36] not in known and os.path.isfile(path):
+                    self._reclaim(path)
+
+    def _enforce_watermark(self, jobs):
+        usage = shutil.disk_usage(self.converter.work_root)
+        if usage.used / usage.total <= self.high_watermark:
+            return
+
+        # Oldest finished outputs go first
+        completed = sorted(
+            (job.get('updated', 0), job_id) for job_id, job in jobs.items() if job.get('status') == 'completed'
+        )
+        for _, job_id in completed:
+            self._expire(job_id)
+            usage = shutil.disk_usage(self.converter.work_root)
+            if usage.used / usage.total <= self.low_watermark:
+                break
+        logging.warning(f"Disk above {self.high_watermark:.0%}, evicted completed outputs")
+
+    def _expire(self, job_id):
+        reclaimed, files = self.converter.expire_job(job_id)
+        self.stats['jobs_expired'] += 1
+        self.stats['files_removed'] += files
+        self.stats['bytes_reclaimed'] += reclaimed
+
+    def _reclaim(self, path):
+        reclaimed, files = remove_path(path)
+        self.stats['files_removed'] += files
+        self.stats['bytes_reclaimed'] += reclaimed
+        logging.info(f"Janitor removed orphan {path} ({reclaimed} bytes)")
+
+
+def remove_path(path):
+    """Delete a file or directory tree; returns (bytes freed, files removed)"""
+    reclaimed = files = 0
+    if os.path.isdir(path):
+        for root, _, names in os.walk(path):
+            for name in names:
+                try:
+                    reclaimed += os.path.getsize(os.path.join(root, name))
+                    files += 1
+                except OSError:
+                    pass
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        try:
+            reclaimed = os.path.getsize(path)
+            os.remove(path)
+            files = 1
+        except OSError:
+            pass
+    return reclaimed, files
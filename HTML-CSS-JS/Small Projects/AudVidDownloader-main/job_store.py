@@ -0,0 +1,159 @@
+import os
+import copy
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class JobStore:
+    """Where job state lives, so any worker process can answer for any job"""
+
+    def get(self, job_id):
+        """Get a job dict, or None"""
+        raise NotImplementedError
+
+    def save_many(self, jobs):
+        """Save {job_id: job} in one batch; older versions never overwrite newer ones"""
+        raise NotImplementedError
+
+    def save(self, job_id, job):
+        """Save a single job"""
+        self.save_many({job_id: job})
+
+    def claim(self, job_id, owner, job):
+        """Replace a job only if it still belongs to owner; returns whether it was replaced"""
+        raise NotImplementedError
+
+    def delete(self, job_id):
+        """Remove a job"""
+        raise NotImplementedError
+
+    def active_count(self, client_id):
+        """Number of unfinished jobs submitted by a client"""
+        raise NotImplementedError
+
+    def all(self):
+        """Get every stored job as {job_id: job}"""
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """Process-local store; only correct with a single worker process"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job else None
+
+    def save_many(self, jobs):
+        with self._lock:
+            for job_id, job in jobs.items():
+                existing = self._jobs.get(job_id)
+                if existing and existing.get('version', 0) > job.get('version', 0):
+                    continue
+                self._jobs[job_id] = copy.deepcopy(job)
+
+    def claim(self, job_id, owner, job):
+        with self._lock:
+            existing = self._jobs.get(job_id)
+            if not existing or (existing.get('owner') or '') != owner:
+                return False
+            self._jobs[job_id] = copy.deepcopy(job)
+            return True
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def active_count(self, client_id):
+        with self._lock:
+            return sum(1 for job in self._jobs.values()
+                       if job.get('status') not in ('completed', 'error')
+                       and (job.get('params') or {}).get('client_id') == client_id)
+
+    def all(self):
+        with self._lock:
+            return copy.deepcopy(self._jobs)
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite-backed store shared by every worker on the host, in WAL mode so reads don't block writes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'job_id TEXT PRIMARY KEY, status TEXT, version INTEGER, updated REAL, data TEXT)'
+        )
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, job_id):
+        row = self._connection().execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, jobs):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                'INSERT INTO jobs (job_id, status, version, updated, data) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(job_id) DO UPDATE SET status = excluded.status, version = excluded.version, '
+                'updated = excluded.updated, data = excluded.data WHERE excluded.version >= jobs.version',
+                [(job_id, job.get('status'), job.get('version', 0), now, json.dumps(job))
+                 for job_id, job in jobs.items()]
+            )
+
+    def claim(self, job_id, owner, job):
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, version = ?, updated = ?, data = ? "
+                "WHERE job_id = ? AND IFNULL(json_extract(data, '$.owner'), '') = ?",
+                (job.get('status'), job.get('version', 0), time.time(), json.dumps(job), job_id, owner)
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, job_id):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+    def active_count(self, client_id):
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status NOT IN ('completed', 'error') "
+            "AND json_extract(data, '$.params.client_id') = ?", (client_id,)
+        ).fetchone()
+        return row[0]
+
+    def all(self):
+        rows = self._connection().execute('SELECT job_id, data FROM jobs').fetchall()
+        return {job_id: json.loads(data) for job_id, data in rows}
+
+
+def create_job_store(url=None):
+    """Build a job store from a URL: 'memory' or 'sqlite:///path/to/jobs.db'"""
+    url = url or os.environ.get(
+        'MEDIA_JOB_STORE', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'mediaconverter-jobs.db'))
+    if url == 'memory':
+        return MemoryJobStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteJobStore(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported job store: {url}")
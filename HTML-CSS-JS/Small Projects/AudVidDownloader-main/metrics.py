@@ -0,0 +1,186 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+import time
+
+
+class Metrics:
+    """Counters, gauges and histograms rendered in the Prometheus text format
+
+    Each process periodically writes its values to a shared directory, and
+    render() adds up every process's file, so a scrape that lands on any one
+    worker process still reports the whole server. Gauges only count
+    processes that are still alive.
+    """
+
+    DEFAULT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, directory=None, interval=5):
+        self.directory = directory or os.environ.get(
+            'MEDIA_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'mediaconverter-metrics'))
+        self.interval = interval
+        self._types = {}  # name -> (type, help)
+        self._buckets = {}  # histogram name -> bucket upper bounds
+        self._counters = {}  # (name, labels) -> value
+        self._gauges = {}
+        self._histograms = {}  # (name, labels) -> [per-bucket counts..., sum, count]
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._path = os.path.join(self.directory, f"{os.getpid()}.json")
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_dead_snapshots()
+        writer = threading.Thread(target=self._write_loop, name='metrics-writer')
+        writer.daemon = True
+        writer.start()
+
+    def describe(self, name, kind, help_text, buckets=None):
+        """Declare a metric's type ('counter', 'gauge' or 'histogram') and help text"""
+        self._types[name] = (kind, help_text)
+        if kind == 'histogram':
+            with self._lock:
+                # A histogram that already has samples keeps the buckets they were counted in
+                if not any(key[0] == name for key in self._histograms):
+                    self._buckets[name] = tuple(buckets or self.DEFAULT_BUCKETS)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, self._label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, self._label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, self._label_key(labels))
+        with self._lock:
+            # Undeclared histograms get the default buckets rather than failing the caller
+            buckets = self._buckets.setdefault(name, self.DEFAULT_BUCKETS)
+            values = self._histograms.setdefault(key, [0] * (len(buckets) + 2))
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    values[i] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def add_collector(self, func):
+        """Register a callable returning [(name, labels dict, value)], sampled at snapshot time"""
+        self._collectors.append(func)
+
+    def snapshot(self):
+        """This process's metrics as a JSON-friendly dict"""
+        sampled = {}
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    sampled[(name, self._label_key(labels))] = value
+            except Exception as e:
+                logging.error(f"Metrics collector error: {str(e)}")
+
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+        for key, value in sampled.items():
+            if self._types.get(key[0], ('gauge',))[0] == 'counter':
+                counters[key] = value
+            else:
+                gauges[key] = value
+
+        return {
+            'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+            'gauges': [[name, dict(labels), value] for (name, labels), value in gauges.items()],
+            'histograms': [[name, dict(labels), values] for (name, labels), values in histograms.items()]
+        }
+
+    def render(self):
+        """All processes' metrics in Prometheus text exposition format"""
+        self._write_snapshot()
+        counters, gauges, histograms = {}, {}, {}
+        for pid, data in self._read_snapshots():
+            for name, labels, value in data['counters']:
+                key = (name, self._label_key(labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in data['histograms']:
+                key = (name, self._label_key(labels))
+                merged = histograms.setdefault(key, [0] * len(values))
+                histograms[key] = [a + b for a, b in zip(merged, values)]
+            if self._process_alive(pid):
+                for name, labels, value in data['gauges']:
+                    key = (name, self._label_key(labels))
+                    gauges[key] = gauges.get(key, 0) + value
+
+        lines = []
+        for name in sorted({key[0] for key in list(counters) + list(gauges) + list(histograms)}):
+            kind, help_text = self._types.get(name, ('untyped', ''))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(list(counters.items()) + list(gauges.items())):
+                if metric == name:
+                    lines.append(f"{name}{self._format_labels(labels)} {value}")
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(self._buckets.get(name, ()), values):
+                    lines.append(f"{name}_bucket{self._format_labels(labels + (('le', str(bound)),))} {count}")
+                lines.append(f"{name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {round(values[-2], 6)}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {values[-1]}")
+        return '\n'.join(lines) + '\n'
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.interval)
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        tmp_path = f"{self._path}.tmp{threading.get_ident()}"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            logging.error(f"Metrics write error: {str(e)}")
+
+    def _read_snapshots(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or not name[:-5].isdigit():
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    yield int(name[:-5]), json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def _remove_dead_snapshots(self):
+        # Counters restart from zero with the server, as Prometheus expects
+        for name in os.listdir(self.directory):
+            pid = name.split('.')[0]
+            if pid.isdigit() and not self._process_alive(int(pid)):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _process_alive(self, pid):
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _label_key(self, labels):
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def _format_labels(self, labels):
+        if not labels:
+            return ''
+        escaped = (k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' for k, v in labels)
+        return '{' + ','.join(escaped) + '}'
@@ -0,0 +1,199 @@
+import os
+import math
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class RateLimitStore:
+    """Where per-client token buckets and daily byte totals live"""
+
+    def take(self, client_id, rate, burst, cost=1):
+        """Refill the client's bucket, then take cost tokens if there are enough; returns (allowed, tokens left)"""
+        raise NotImplementedError
+
+    def add_bytes(self, client_id, day, amount):
+        """Add to the bytes a client has used on day (YYYY-MM-DD)"""
+        raise NotImplementedError
+
+    def get_bytes(self, client_id, day):
+        """Bytes a client has used on day"""
+        raise NotImplementedError
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Process-local limits; each worker process counts separately"""
+
+    def __init__(self):
+        self._buckets = {}  # client_id -> (tokens, updated)
+        self._usage = {}  # (client_id, day) -> bytes
+        self._lock = threading.Lock()
+
+    def take(self, client_id, rate, burst, cost=1):
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(client_id, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[client_id] = (tokens, now)
+            return allowed, tokens
+
+    def add_bytes(self, client_id, day, amount):
+        with self._lock:
+            # Only today's totals matter
+            for key in [key for key in self._usage if key[1] != day]:
+                del self._usage[key]
+            self._usage[(client_id, day)] = self._usage.get((client_id, day), 0) + amount
+
+    def get_bytes(self, client_id, day):
+        with self._lock:
+            return self._usage.get((client_id, day), 0)
+
+
+class SQLiteRateLimitStore(RateLimitStore):
+    """SQLite-backed limits shared by every worker on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets (client_id TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS usage (client_id TEXT, day TEXT, bytes INTEGER, PRIMARY KEY (client_id, day))'
+        )
+        conn.commit()
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, client_id, rate, burst, cost=1):
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front, so two workers can't both spend the same tokens
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE client_id = ?', (client_id,)).fetchone()
+            tokens, updated = row or (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                'INSERT INTO buckets (client_id, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(client_id) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (client_id, tokens, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, tokens
+
+    def add_bytes(self, client_id, day, amount):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO usage (client_id, day, bytes) VALUES (?, ?, ?) '
+                'ON CONFLICT(client_id, day) DO UPDATE SET bytes = bytes + excluded.bytes',
+                (client_id, day, amount)
+            )
+            conn.execute('DELETE FROM usage WHERE day < ?', (day,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_bytes(self, client_id, day):
+        row = self._connection().execute(
+            'SELECT bytes FROM usage WHERE client_id = ? AND day = ?', (client_id, day)
+        ).fetchone()
+        return row[0] if row else 0
+
+
+def create_rate_limit_store(url=None):
+    """Build a rate limit store from a URL: 'memory' or 'sqlite:///path/to/limits.db'"""
+    url = url or os.environ.get(
+        'MEDIA_RATE_LIMIT_STORE', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'mediaconverter-limits.db'))
+    if url == 'memory':
+        return MemoryRateLimitStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteRateLimitStore(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported rate limit store: {url}")
+
+
+class RateLimiter:
+    """Per-client request rate (token bucket), concurrent-job and bytes-per-day limits
+
+    active_jobs is a callable returning how many unfinished jobs a client has;
+    it is asked rather than counted here so crashed jobs don't leak slots.
+    """
+
+    def __init__(self, active_jobs, store=None):
+        self.active_jobs = active_jobs
+        self.store = store or create_rate_limit_store()
+        # Requests per minute, and how many can be made back to back; 0 turns the bucket off
+        self.per_minute = float(os.environ.get('MEDIA_RATE_LIMIT_PER_MINUTE', 10))
+        self.burst = int(os.environ.get('MEDIA_RATE_LIMIT_BURST', 10))
+        self.max_jobs = int(os.environ.get('MEDIA_MAX_JOBS_PER_CLIENT', 5))
+        # Output bytes per client per UTC day; 0 for no limit
+        self.max_bytes_per_day = int(os.environ.get('MEDIA_MAX_BYTES_PER_DAY', 5 * 1024 ** 3))
+
+    def check(self, client_id, cost=1):
+        """Decide whether a client may start a job now
+
+        Returns a dict with 'allowed', the X-RateLimit-* / X-Quota-* 'headers'
+        to send either way and, when refused, 'error', 'status_code' and
+        'retry_after'. Tokens are only spent when everything else passes.
+        """
+        headers = {}
+        day = self._today()
+
+        active = self.active_jobs(client_id)
+        headers['X-Quota-Jobs-Limit'] = str(self.max_jobs)
+        headers['X-Quota-Jobs-Remaining'] = str(max(0, self.max_jobs - active))
+        if active >= self.max_jobs:
+            return self._refuse(headers, f'Too many active jobs (limit {self.max_jobs}), wait for one to finish', 30)
+
+        if self.max_bytes_per_day:
+            used = self.store.get_bytes(client_id, day)
+            headers['X-Quota-Bytes-Limit'] = str(self.max_bytes_per_day)
+            headers['X-Quota-Bytes-Remaining'] = str(max(0, self.max_bytes_per_day - used))
+            if used >= self.max_bytes_per_day:
+                return self._refuse(headers, 'Daily download quota used up, try again tomorrow', self._seconds_to_midnight())
+
+        if self.per_minute:
+            rate = self.per_minute / 60
+            allowed, tokens = self.store.take(client_id, rate, self.burst, cost)
+            headers['X-RateLimit-Limit'] = str(self.burst)
+            headers['X-RateLimit-Remaining'] = str(int(tokens))
+            headers['X-RateLimit-Reset'] = str(math.ceil((self.burst - tokens) / rate))
+            if not allowed:
+                return self._refuse(headers, 'Too many requests, slow down', math.ceil((cost - tokens) / rate))
+
+        return {'allowed': True, 'headers': headers}
+
+    def record_bytes(self, client_id, amount):
+        """Count output bytes against a client's daily quota"""
+        if client_id and amount:
+            self.store.add_bytes(client_id, self._today(), amount)
+
+    def _refuse(self, headers, error, retry_after):
+        headers['Retry-After'] = str(retry_after)
+        return {'allowed': False, 'headers': headers, 'error': error, 'status_code': 429, 'retry_after': retry_after}
+
+    def _today(self):
+        return time.strftime('%Y-%m-%d', time.gmtime())
+
+    def _seconds_to_midnight(self):
+        return 86400 - int(time.time()) % 86400
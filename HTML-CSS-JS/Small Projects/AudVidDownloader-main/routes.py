@@ -1,14 +1,29 @@
 import os
+import json
 import tempfile
 import logging
-from flask import render_template, request, jsonify, send_file, flash, redirect, url_for
+from flask import render_template, request, jsonify, send_file, flash, redirect, url_for, Response, stream_with_context
 from app import app
 from converter import MediaConverter
 import uuid
+import hashlib
+import time
+import mimetypes
+from urllib.parse import quote
 
 # Global converter instance
 converter = MediaConverter()
 
+# How /download hands off file bodies: 'none' (streamed by the app server), 'x-accel' (nginx) or 'x-sendfile'
+DOWNLOAD_OFFLOAD = os.environ.get('MEDIA_DOWNLOAD_OFFLOAD', 'none')
+X_ACCEL_PREFIX = os.environ.get('MEDIA_X_ACCEL_PREFIX', '/protected-media/')
+
+# API keys that identify a client for rate limits instead of its IP; unknown keys are ignored
+API_KEYS = {key.strip() for key in os.environ.get('MEDIA_API_KEYS', '').split(',') if key.strip()}
+
+# Most URLs one /info request may look up
+INFO_BATCH_LIMIT = int(os.environ.get('MEDIA_INFO_BATCH_LIMIT', 20))
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -22,6 +37,7 @@ def convert_media():
         output_format = data.get('format', 'mp3').lower()
         quality = data.get('quality', 'best')
         bitrate = data.get('bitrate', None)
+        preset = data.get('preset') or None  # fast, balanced, quality or auto
         
         # Handle single URL or batch URLs
         if url:
@@ -31,31 +47,75 @@ def convert_media():
         else:
             return jsonify({'error': 'URL or URLs are required'}), 400
         
+        if preset and preset != 'auto' and preset not in MediaConverter.ENCODER_PRESETS:
+            return jsonify({'error': f'Unsupported preset: {preset}'}), 400
+        
+        # Optional 1-based, inclusive range of playlist positions
+        playlist_range = None
+        if data.get('playlist_start') or data.get('playlist_end'):
+            try:
+                start = int(data.get('playlist_start') or 1)
+                end = int(data['playlist_end']) if data.get('playlist_end') else None
+            except (TypeError, ValueError):
+                return jsonify({'error': 'playlist_start and playlist_end must be whole numbers'}), 400
+            if start < 1 or (end is not None and end < start):
+                return jsonify({'error': 'Invalid playlist range'}), 400
+            playlist_range = [start, end]
+        
         # Validate URLs
+        started = time.time()
         for u in urls_to_process:
             if not converter.validate_url(u):
                 return jsonify({'error': f'Invalid or unsupported URL: {u}'}), 400
+        validate_seconds = time.time() - started
+        
+        # Enforce per-client limits once the request is known to be valid, so a
+        # rejected request doesn't spend a token
+        client_id = client_key()
+        limit = converter.limiter.check(client_id)
+        if not limit['allowed']:
+            response = jsonify({'error': limit['error']})
+            response.headers.update(limit['headers'])
+            return response, limit['status_code']
         
         # Generate unique job ID
         job_id = str(uuid.uuid4())
         
-        # Start conversion in background
+        # Queue conversion in background
         result = converter.convert(urls_to_process if len(urls_to_process) > 1 else urls_to_process[0], 
-                                 output_format, quality, job_id, bitrate)
+                                 output_format, quality, job_id, bitrate, client_id=client_id,
+                                 preset=preset, playlist_range=playlist_range)
         
         if result['success']:
-            return jsonify({
+            converter.record_stage(result['job_id'], 'validate', validate_seconds)
+            # Identical in-flight requests share one job, so use the id we got back
+            response = jsonify({
                 'success': True,
-                'job_id': job_id,
-                'message': 'Conversion started successfully'
+                'job_id': result['job_id'],
+                'message': 'Conversion queued successfully'
             })
+            response.headers.update(limit['headers'])
+            return response
         else:
-            return jsonify({'error': result.get('error', 'Unknown error')}), 500
+            # 503 when the whole queue is full
+            response = jsonify({'error': result.get('error', 'Unknown error')})
+            response.headers.update(limit['headers'])
+            if result.get('retry_after'):
+                response.headers['Retry-After'] = str(result['retry_after'])
+            return response, result.get('status_code', 500)
             
     except Exception as e:
         logging.error(f"Conversion error: {str(e)}")
         return jsonify({'error': f'Conversion failed: {str(e)}'}), 500
 
+def client_key():
+    """Who a request counts against: a configured API key, otherwise the client IP"""
+    api_key = request.headers.get('X-API-Key')
+    if api_key in API_KEYS:
+        return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    # ProxyFix has already swapped in the address from X-Forwarded-For
+    return 'ip:' + (request.remote_addr or 'unknown')
+
 @app.route('/formats')
 def get_formats():
     """Get supported formats and their options"""
@@ -66,27 +126,165 @@ def get_formats():
         logging.error(f"Format retrieval error: {str(e)}")
         return jsonify({'error': 'Failed to get formats'}), 500
 
+@app.route('/info', methods=['GET', 'POST'])
+def get_info():
+    """Metadata, source formats and output estimates for a URL (?url=) or a batch ({"urls": [...]})"""
+    try:
+        data = request.get_json(silent=True) or {}
+        url = (request.args.get('url') or data.get('url') or '').strip()
+        urls = [u.strip() for u in data.get('urls', []) if u.strip()]
+        if not url and not urls:
+            return jsonify({'error': 'URL or URLs are required'}), 400
+        if len(urls) > INFO_BATCH_LIMIT:
+            return jsonify({'error': f'At most {INFO_BATCH_LIMIT} URLs per request'}), 400
+        
+        lookup = [u for u in dict.fromkeys(urls or [url]) if converter.validate_url(u)]
+        found = dict(zip(lookup, converter.get_video_infos(lookup))) if lookup else {}
+        
+        if url and not urls:
+            if url not in found:
+                return jsonify({'error': f'Invalid or unsupported URL: {url}'}), 400
+            if found[url] is None:
+                return jsonify({'error': 'Could not read media information'}), 502
+            response = jsonify({'success': True, 'info': found[url]})
+        else:
+            results = []
+            for u in urls:
+                if u not in found:
+                    results.append({'url': u, 'success': False, 'error': 'Invalid or unsupported URL'})
+                elif found[u] is None:
+                    results.append({'url': u, 'success': False, 'error': 'Could not read media information'})
+                else:
+                    results.append({'url': u, 'success': True, 'info': found[u]})
+            response = jsonify({'success': True, 'results': results})
+        
+        # Matches the server-side metadata cache, so repeat lookups don't even reach us
+        response.headers['Cache-Control'] = f'private, max-age={converter.metadata_cache.ttl}'
+        return response
+    
+    except Exception as e:
+        logging.error(f"Info error: {str(e)}")
+        return jsonify({'error': 'Failed to get media information'}), 500
+
 @app.route('/download/<job_id>')
 def download_file(job_id):
     try:
+        started = time.time()
+        archive = converter.get_archive(job_id)
+        if archive:
+            return send_archive(archive, f"{job_id}_archive.zip",
+                                on_close=lambda sent: record_serve(job_id, started, sent))
+        
         file_path = converter.get_output_file(job_id)
         if file_path and os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True, download_name=os.path.basename(file_path))
+            download_name = os.path.basename(file_path)
+            relative_path = os.path.relpath(file_path, converter.work_root)
+            if DOWNLOAD_OFFLOAD == 'x-accel' and not relative_path.startswith('..'):
+                # nginx serves the bytes (ranges included) from an internal location mapped to MEDIA_WORK_DIR
+                response = Response(mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+                response.headers['X-Accel-Redirect'] = X_ACCEL_PREFIX + quote(relative_path)
+                response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+                return response
+            
+            # Range, If-Range, ETag and If-Modified-Since are handled here; with
+            # MEDIA_DOWNLOAD_OFFLOAD=x-sendfile the body is left to the front server
+            response = send_file(file_path, as_attachment=True, download_name=download_name,
+                                 conditional=True, etag=True, last_modified=os.path.getmtime(file_path))
+            response.headers['Cache-Control'] = 'private, no-transform'
+            # The page sends a HEAD before each download, and 304s carry no body; neither is a serve
+            if request.method != 'HEAD' and response.status_code in (200, 206):
+                record_serve(job_id, started, response.content_length or 0)
+            return response
         else:
             return jsonify({'error': 'File not found or expired'}), 404
     except Exception as e:
         logging.error(f"Download error: {str(e)}")
         return jsonify({'error': 'Download failed'}), 500
 
+def record_serve(job_id, started, sent_bytes):
+    """Record a download's serve time and bytes
+    
+    File bodies go out through sendfile or the front proxy without passing
+    through Python, so for those this covers preparing the response only;
+    streamed archives are timed until the last byte.
+    """
+    converter.record_stage(job_id, 'serve', time.time() - started)
+    converter.metrics.inc('mediaconverter_served_bytes_total', sent_bytes)
+
+def send_archive(archive, download_name, on_close=None):
+    """Stream a generated zip with an exact length, honouring conditional and single Range requests"""
+    etag = archive.etag
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+    
+    start, stop, status = 0, archive.size, 200
+    byte_range = request.range
+    # If-Range by date can't be checked (no Last-Modified), so only an ETag match keeps the range
+    if_range = request.if_range
+    if byte_range and len(byte_range.ranges) == 1 and if_range.date is None and if_range.etag in (None, etag):
+        span = byte_range.range_for_length(archive.size)
+        if span is None:
+            return Response(status=416, headers={'Content-Range': f'bytes */{archive.size}'})
+        start, stop = span
+        status = 206
+    
+    def body():
+        sent = 0
+        try:
+            for chunk in archive.iter_range(start, stop):
+                sent += len(chunk)
+                yield chunk
+        finally:
+            if on_close:
+                on_close(sent)
+    
+    response = Response(body(), status=status, mimetype='application/zip', direct_passthrough=True)
+    response.headers['Content-Length'] = str(stop - start)
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{archive.size}'
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    response.headers['Cache-Control'] = 'private, no-transform'
+    return response
+
 @app.route('/status/<job_id>')
 def get_status(job_id):
     try:
-        status = converter.get_status(job_id)
+        # Long-poll: ?since=<version> holds the request until the job changes
+        since = request.args.get('since', type=int)
+        if since is not None:
+            status = converter.wait_for_update(job_id, since, timeout=25) or converter.get_status(job_id)
+        else:
+            status = converter.get_status(job_id)
         return jsonify(status)
     except Exception as e:
         logging.error(f"Status error: {str(e)}")
         return jsonify({'error': 'Failed to get status'}), 500
 
+@app.route('/events/<job_id>')
+def job_events(job_id):
+    """Push job status as Server-Sent Events until the job finishes"""
+    def generate():
+        version = -1
+        while True:
+            status = converter.wait_for_update(job_id, version, timeout=15)
+            if status is None:
+                # Nothing changed; resend so queue position/ETA stay fresh and proxies keep the connection
+                status = converter.get_status(job_id)
+            version = status.get('version', version)
+            yield f"data: {json.dumps(status)}\n\n"
+            if status['status'] in ('completed', 'error', 'not_found'):
+                break
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint covering every worker process"""
+    return Response(converter.metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/cleanup/<job_id>', methods=['POST'])
 def cleanup_file(job_id):
     try:
@@ -0,0 +1,134 @@
+import os
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler cannot accept more work"""
+    def __init__(self, message, status_code=503, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """Bounded, priority-aware job queue with separate download and transcode pools"""
+
+    # Lower values are scheduled first
+    PRIORITY_SINGLE = 0
+    PRIORITY_BATCH = 1
+    PRIORITY_PLAYLIST = 2
+
+    def __init__(self, download_workers=None, transcode_workers=None, max_queue=None):
+        self.download_workers = download_workers or int(os.environ.get('MEDIA_DOWNLOAD_WORKERS', 4))
+        self.transcode_workers = transcode_workers or int(os.environ.get('MEDIA_TRANSCODE_WORKERS', os.cpu_count() or 1))
+        self.max_queue = max_queue or int(os.environ.get('MEDIA_MAX_QUEUE', 100))
+
+        # FFmpeg work is CPU bound, so it gets its own pool sized to the cores
+        self.transcode_pool = ThreadPoolExecutor(max_workers=self.transcode_workers, thread_name_prefix='transcode')
+        # Jobs fan their items out in parallel, so the network bound is held per item
+        # download rather than per job; every job's items share these slots
+        self.download_slots = threading.BoundedSemaphore(self.download_workers)
+
+        self._queue = []  # heap of (client_round, priority, seq, job_id)
+        self._pending = {}  # job_id -> (client_id, func, args)
+        self._active = {}  # job_id -> client_id
+        self._client_counts = {}  # client_id -> queued + running jobs
+        self._durations = deque(maxlen=50)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        for i in range(self.download_workers):
+            worker = threading.Thread(target=self._worker, name=f'download-{i}')
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, job_id, func, args=(), client_id=None, priority=PRIORITY_SINGLE):
+        """Queue a job without blocking; raises QueueFullError on backpressure"""
+        with self._cond:
+            if len(self._pending) >= self.max_queue:
+                raise QueueFullError('Server is busy, please try again shortly',
+                                     status_code=503, retry_after=self._estimate_wait(len(self._pending)))
+
+            # A client's n-th outstanding job is ranked behind every other client's
+            # earlier jobs, so one user with many submissions can't starve the rest
+            # (how many jobs a client may have at all is the rate limiter's call)
+            client_jobs = self._client_counts.get(client_id, 0)
+            heapq.heappush(self._queue, (client_jobs, priority, next(self._seq), job_id))
+            self._pending[job_id] = (client_id, func, args)
+            self._client_counts[client_id] = client_jobs + 1
+            self._cond.notify()
+
+    def cancel(self, job_id):
+        """Drop a job that has not started yet"""
+        with self._cond:
+            entry = self._pending.pop(job_id, None)
+            if entry is None:
+                return False
+            self._release_client(entry[0])
+            return True
+
+    def queue_info(self, job_id):
+        """Get queue position (1-based) and estimated seconds until start for a queued job"""
+        with self._cond:
+            if job_id not in self._pending:
+                return None
+            ordered = sorted(entry for entry in self._queue if entry[3] in self._pending)
+            position = next(i for i, entry in enumerate(ordered, 1) if entry[3] == job_id)
+            return {'queue_position': position, 'eta': self._estimate_wait(position)}
+
+    def stats(self):
+        """Get a snapshot of queue depth and worker usage"""
+        with self._cond:
+            return {
+                'queued': len(self._pending),
+                'active': len(self._active),
+                'download_workers': self.download_workers,
+                'transcode_workers': self.transcode_workers
+            }
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job_id = heapq.heappop(self._queue)[3]
+                entry = self._pending.pop(job_id, None)
+                if entry is None:
+                    # Cancelled while queued
+                    continue
+                client_id, func, args = entry
+                self._active[job_id] = client_id
+
+            started = time.time()
+            try:
+                func(*args)
+            except Exception as e:
+                logging.error(f"Scheduled job {job_id} failed: {str(e)}")
+            finally:
+                with self._cond:
+                    self._active.pop(job_id, None)
+                    self._release_client(client_id)
+                    self._durations.append(time.time() - started)
+
+    def _release_client(self, client_id):
+        remaining = self._client_counts.get(client_id, 1) - 1
+        if remaining > 0:
+            self._client_counts[client_id] = remaining
+        else:
+            self._client_counts.pop(client_id, None)
+
+    def _average_duration(self):
+        if not self._durations:
+            return 60
+        return int(sum(self._durations) / len(self._durations)) or 1
+
+    def _estimate_wait(self, position):
+        # Jobs ahead of us drain in waves of download_workers
+        waves = (position + self.download_workers - 1) // self.download_workers
+        return waves * self._average_duration()
@@ -2,6 +2,9 @@ class MediaConverter {
     constructor() {
         this.currentJobId = null;
         this.pollInterval = null;
+        this.eventSource = null;
+        this.statusVersion = -1;
+        this.mediaInfo = null;
         this.initializeEventListeners();
     }
 
@@ -16,6 +19,9 @@ class MediaConverter {
         downloadBtn.addEventListener('click', () => this.downloadFile());
         newConversionBtn.addEventListener('click', () => this.resetForm());
         formatSelect.addEventListener('change', () => this.updateFormatOptions());
+        document.getElementById('urlInput').addEventListener('change', () => this.loadPreview());
+        document.getElementById('qualitySelect').addEventListener('change', () => this.updateEstimate());
+        document.getElementById('bitrateSelect').addEventListener('change', () => this.updateEstimate());
         
         // Mode switching
         modeRadios.forEach(radio => {
@@ -102,6 +108,70 @@ class MediaConverter {
                 bitrateSelect.innerHTML = '<option value="" selected>Lossless</option>';
             }
         }
+
+        this.updateEstimate();
+    }
+
+    async loadPreview() {
+        const url = document.getElementById('urlInput').value.trim();
+        this.mediaInfo = null;
+        document.getElementById('mediaPreview').classList.add('d-none');
+        if (!url || !this.isValidUrl(url)) {
+            return;
+        }
+
+        try {
+            const response = await fetch(`/info?url=${encodeURIComponent(url)}`);
+            const data = await response.json();
+            // Drop answers for a URL that has been replaced in the meantime
+            if (!response.ok || !data.success || document.getElementById('urlInput').value.trim() !== url) {
+                return;
+            }
+            this.mediaInfo = data.info;
+        } catch (error) {
+            console.error('Preview error:', error);
+            return;
+        }
+
+        const info = this.mediaInfo;
+        const thumbnail = document.getElementById('previewThumbnail');
+        document.getElementById('previewTitle').textContent = info.title;
+        document.getElementById('previewDetails').textContent = info.type === 'playlist'
+            ? `Playlist, up to ${info.item_limit} items`
+            : `${info.duration} · ${info.uploader}`;
+        thumbnail.classList.toggle('d-none', !info.thumbnail);
+        if (info.thumbnail) {
+            thumbnail.src = info.thumbnail;
+        }
+        document.getElementById('previewWarning').classList.toggle('d-none', !(info.duration_seconds > 3600));
+        document.getElementById('mediaPreview').classList.remove('d-none');
+        this.updateEstimate();
+    }
+
+    updateEstimate() {
+        const estimate = document.getElementById('previewEstimate');
+        estimate.textContent = '';
+        if (!this.mediaInfo || !this.mediaInfo.estimates) {
+            return;
+        }
+
+        const format = document.getElementById('formatSelect').value;
+        const quality = document.getElementById('qualitySelect').value;
+        const bitrate = document.getElementById('bitrateSelect').value || null;
+        const row = (this.mediaInfo.estimates[format] || []).find(
+            option => 'quality' in option ? option.quality === quality : option.bitrate === bitrate
+        );
+        if (!row || !row.size) {
+            return;
+        }
+
+        let text = `Estimated ${format.toUpperCase()} size: ~${this.formatBytes(row.size)}`;
+        if (row.remux) {
+            text += ', no re-encoding needed';
+        } else {
+            text += `, about ${row.seconds < 60 ? Math.ceil(row.seconds) + 's' : Math.round(row.seconds / 60) + ' min'} to convert`;
+        }
+        estimate.textContent = text;
     }
 
     async handleSubmit(e) {
@@ -111,11 +181,13 @@ class MediaConverter {
         const format = document.getElementById('formatSelect').value;
         const quality = document.getElementById('qualitySelect').value;
         const bitrate = document.getElementById('bitrateSelect').value;
+        const preset = document.getElementById('presetSelect').value;
         
         let requestData = {
             format: format,
             quality: quality,
-            bitrate: bitrate || null
+            bitrate: bitrate || null,
+            preset: preset
         };
 
         // Get URLs based on mode
@@ -163,6 +235,15 @@ class MediaConverter {
                 return;
             }
             requestData.url = playlistUrl;
+
+            const playlistStart = document.getElementById('playlistStartInput').value;
+            const playlistEnd = document.getElementById('playlistEndInput').value;
+            if (playlistStart) {
+                requestData.playlist_start = parseInt(playlistStart, 10);
+            }
+            if (playlistEnd) {
+                requestData.playlist_end = parseInt(playlistEnd, 10);
+            }
         }
 
         this.showProgress('Starting conversion...');
@@ -181,7 +262,8 @@ class MediaConverter {
 
             if (response.ok && data.success) {
                 this.currentJobId = data.job_id;
-                this.pollJobStatus();
+                this.statusVersion = -1;
+                this.watchJobStatus();
             } else {
                 this.showError(data.error || 'Conversion failed');
                 this.disableForm(false);
@@ -193,48 +275,111 @@ class MediaConverter {
         }
     }
 
+    watchJobStatus() {
+        if (!this.currentJobId) return;
+        
+        // Server pushes updates; fall back to long-polling if EventSource isn't available or drops
+        if (!window.EventSource) {
+            this.pollJobStatus();
+            return;
+        }
+        
+        this.stopWatching();
+        this.eventSource = new EventSource(`/events/${this.currentJobId}`);
+        this.eventSource.onmessage = (event) => {
+            if (this.handleStatus(JSON.parse(event.data))) {
+                this.stopWatching();
+            }
+        };
+        this.eventSource.onerror = () => {
+            this.stopWatching();
+            this.pollJobStatus();
+        };
+    }
+
+    stopWatching() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+        if (this.pollInterval) {
+            clearTimeout(this.pollInterval);
+            this.pollInterval = null;
+        }
+    }
+
     async pollJobStatus() {
         if (!this.currentJobId) return;
         
         try {
-            const response = await fetch(`/status/${this.currentJobId}`);
+            // The server holds this request until the job changes, so no fixed interval is needed
+            const response = await fetch(`/status/${this.currentJobId}?since=${this.statusVersion}`);
             const data = await response.json();
             
-            if (data.status === 'completed') {
-                clearInterval(this.pollInterval);
-                this.showSuccess(data.title || 'Conversion complete', data.duration || 'Unknown');
-            } else if (data.status === 'error') {
-                clearInterval(this.pollInterval);
-                this.showError(data.error || 'Conversion failed');
-                this.disableForm(false);
-            } else {
-                // Update progress
-                const progressBar = document.getElementById('progressBar');
-                const progressStatus = document.getElementById('progressStatus');
-                
-                if (data.progress) {
-                    progressBar.style.width = data.progress + '%';
-                }
-                
-                if (data.status.startsWith('processing_')) {
-                    progressStatus.textContent = `Processing ${data.status.split('_')[1]} of ${data.status.split('_')[3]} files...`;
-                } else {
-                    progressStatus.textContent = this.getStatusMessage(data.status);
-                }
-                
-                // Continue polling
-                setTimeout(() => this.pollJobStatus(), 2000);
+            if (!this.handleStatus(data)) {
+                this.pollInterval = setTimeout(() => this.pollJobStatus(), 250);
             }
         } catch (error) {
             console.error('Status polling error:', error);
-            clearInterval(this.pollInterval);
             this.showError('Failed to get conversion status');
             this.disableForm(false);
         }
     }
 
+    handleStatus(data) {
+        // Returns true once the job has finished either way
+        if (data.version !== undefined) {
+            this.statusVersion = data.version;
+        }
+        
+        if (data.status === 'completed') {
+            this.showSuccess(data.title || 'Conversion complete', data.duration || 'Unknown');
+            return true;
+        } else if (data.status === 'error' || data.status === 'not_found') {
+            this.showError(data.error || 'Conversion failed');
+            this.disableForm(false);
+            return true;
+        }
+        
+        // Update progress
+        const progressBar = document.getElementById('progressBar');
+        const progressStatus = document.getElementById('progressStatus');
+        
+        if (data.progress) {
+            progressBar.style.width = data.progress + '%';
+        }
+        
+        if (data.status === 'queued' && data.queue_position) {
+            const eta = data.eta ? ` (about ${Math.ceil(data.eta / 60)} min)` : '';
+            progressStatus.textContent = `Waiting in queue: position ${data.queue_position}${eta}`;
+        } else if (data.status.startsWith('processing_')) {
+            let details = '';
+            if (data.speed) {
+                details += ` ${this.formatBytes(data.speed)}/s`;
+            }
+            if (data.eta) {
+                details += `, ${data.eta}s left`;
+            }
+            progressStatus.textContent = `Processing ${data.status.split('_')[1]} of ${data.status.split('_')[3]} files...${details}`;
+        } else {
+            progressStatus.textContent = this.getStatusMessage(data.status);
+        }
+        return false;
+    }
+
+    formatBytes(bytes) {
+        const units = ['B', 'KB', 'MB', 'GB'];
+        let i = 0;
+        while (bytes >= 1024 && i < units.length - 1) {
+            bytes /= 1024;
+            i++;
+        }
+        return `${bytes.toFixed(1)} ${units[i]}`;
+    }
+
     getStatusMessage(status) {
         const messages = {
+            'queued': 'Waiting in queue...',
             'starting': 'Initializing conversion...',
             'downloading': 'Downloading content...',
             'converting': 'Converting to selected format...',
@@ -250,23 +395,8 @@ class MediaConverter {
         const progressBar = document.getElementById('progressBar');
         
         progressStatus.textContent = message;
-        progressBar.style.width = '10%';
+        progressBar.style.width = '0%';
         progressCard.classList.remove('d-none');
-        
-        // Simulate progress animation
-        let progress = 10;
-        const interval = setInterval(() => {
-            progress += Math.random() * 20;
-            if (progress > 90) progress = 90;
-            progressBar.style.width = progress + '%';
-            
-            if (progress > 50) {
-                progressStatus.textContent = 'Converting to ' + document.getElementById('formatSelect').value.toUpperCase() + '...';
-            }
-        }, 1000);
-
-        // Clear interval after 10 seconds to prevent infinite running
-        setTimeout(() => clearInterval(interval), 10000);
     }
 
     showSuccess(title, duration) {
@@ -309,37 +439,22 @@ class MediaConverter {
         }
 
         try {
-            const response = await fetch(`/download/${this.currentJobId}`);
+            // Check the file is still there before handing off to the browser
+            const downloadUrl = `/download/${this.currentJobId}`;
+            const response = await fetch(downloadUrl, { method: 'HEAD' });
             
             if (response.ok) {
-                const blob = await response.blob();
-                const url = window.URL.createObjectURL(blob);
+                // Let the browser stream the file itself so large downloads don't
+                // sit in memory and interrupted ones can resume with Range requests.
+                // The server expires the file later, so it's not cleaned up here.
                 const a = document.createElement('a');
-                
-                // Get filename from Content-Disposition header or use default
-                const contentDisposition = response.headers.get('content-disposition');
-                let filename = 'converted_media';
-                
-                if (contentDisposition) {
-                    const filenameMatch = contentDisposition.match(/filename="?([^"]+)"?/);
-                    if (filenameMatch) {
-                        filename = filenameMatch[1];
-                    }
-                }
-                
-                a.href = url;
-                a.download = filename;
+                a.href = downloadUrl;
+                a.download = '';
                 document.body.appendChild(a);
                 a.click();
                 document.body.removeChild(a);
-                window.URL.revokeObjectURL(url);
-                
-                // Optional: Clean up the file on server after download
-                this.cleanupFile();
-                
             } else {
-                const errorData = await response.json();
-                this.showError(errorData.error || 'Download failed');
+                this.showError(response.status === 404 ? 'File not found or expired' : 'Download failed');
             }
         } catch (error) {
             console.error('Download error:', error);
@@ -365,6 +480,8 @@ class MediaConverter {
         document.getElementById('formatSelect').value = 'mp3';
         document.getElementById('singleMode').checked = true;
         this.switchMode();
+        this.mediaInfo = null;
+        document.getElementById('mediaPreview').classList.add('d-none');
         this.updateFormatOptions();
         
         // Hide all status cards
@@ -379,10 +496,8 @@ class MediaConverter {
             this.currentJobId = null;
         }
         
-        // Clear polling
-        if (this.pollInterval) {
-            clearInterval(this.pollInterval);
-        }
+        // Stop status updates
+        this.stopWatching();
         
         // Focus on URL input
         document.getElementById('urlInput').focus();
@@ -393,9 +508,12 @@ class MediaConverter {
             'urlInput',
             'batchUrlInput',
             'playlistUrlInput',
+            'playlistStartInput',
+            'playlistEndInput',
             'formatSelect', 
             'qualitySelect',
             'bitrateSelect',
+            'presetSelect',
             'convertBtn'
         ];
         
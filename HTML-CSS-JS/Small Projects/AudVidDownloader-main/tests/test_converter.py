@@ -0,0 +1,126 @@
+import os
+import sys
+import copy
+import time
+import socket
+import tempfile
+import unittest
+import subprocess
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep every piece of shared state in throwaway directories
+os.environ.update(
+    MEDIA_WORK_DIR=tempfile.mkdtemp(),
+    MEDIA_METRICS_DIR=tempfile.mkdtemp(),
+    MEDIA_JOB_STORE='memory',
+    MEDIA_RATE_LIMIT_STORE='memory',
+    MEDIA_CACHE_MAX_BYTES='0'
+)
+
+import yt_dlp
+import benchmark
+from converter import MediaConverter
+from job_store import MemoryJobStore
+
+# A source offering separate video and audio streams, like most large sites
+SEPARATE_STREAMS = {
+    'id': 'abc123',
+    'title': 'Test video',
+    'extractor': 'test',
+    'extractor_key': 'Test',
+    'webpage_url': 'https://example.com/watch/abc123',
+    'duration': 10,
+    'formats': [
+        {'format_id': 'audio', 'url': 'http://127.0.0.1:9/audio.m4a', 'ext': 'm4a',
+         'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 128, 'tbr': 128},
+        {'format_id': 'video', 'url': 'http://127.0.0.1:9/video.mp4', 'ext': 'mp4',
+         'vcodec': 'avc1.64001f', 'acodec': 'none', 'width': 1280, 'height': 720, 'tbr': 1000}
+    ]
+}
+
+
+def extract_with_default_selection(ydl, url, download=False, **kwargs):
+    """Stands in for YoutubeDL.extract_info: runs yt-dlp's default format selection on SEPARATE_STREAMS"""
+    return ydl.process_ie_result(copy.deepcopy(SEPARATE_STREAMS), download=False)
+
+
+class ExtractInfoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.converter = MediaConverter()
+
+    def test_cached_info_is_reselected_per_target(self):
+        url = SEPARATE_STREAMS['webpage_url']
+        with mock.patch.object(yt_dlp.YoutubeDL, 'extract_info', extract_with_default_selection):
+            info = self.converter._extract_info(url)
+        # extract_info merged video+audio, but that choice mustn't stick to the cached copy
+        self.assertNotIn('requested_formats', info)
+
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+            audio = self.converter._select_formats(ydl, self.converter._extract_info(url), 'mp3', 'best')
+            video = self.converter._select_formats(ydl, self.converter._extract_info(url), 'mp4', '720p')
+        self.assertEqual([fmt['format_id'] for fmt in audio], ['audio'])
+        self.assertEqual(audio[0]['url'], 'http://127.0.0.1:9/audio.m4a')
+        self.assertEqual(sorted(fmt['format_id'] for fmt in video), ['audio', 'video'])
+
+    def test_estimates_select_once_per_format_string(self):
+        targets = set()
+        for output_format, options in self.converter.supported_formats.items():
+            if options['type'] == 'video':
+                choices = [(quality, None) for quality in ['best'] + options['qualities'] + ['worst']]
+            else:
+                choices = [('best', bitrate) for bitrate in [None] + options['bitrates']]
+            for quality, bitrate in choices:
+                format_options = self.converter._format_options(output_format, quality, bitrate)
+                targets.add((format_options['format'], tuple(format_options.get('format_sort', []))))
+
+        process = yt_dlp.YoutubeDL.process_ie_result
+        with mock.patch.object(yt_dlp.YoutubeDL, 'process_ie_result', autospec=True, side_effect=process) as selection:
+            estimates = self.converter._estimate_outputs(SEPARATE_STREAMS)
+        self.assertEqual(selection.call_count, len(targets))
+        self.assertEqual(estimates['mp3'][0]['download_size'], 128 * 125 * 10)
+        self.assertEqual(estimates['mp4'][0]['download_size'], 1128 * 125 * 10)
+
+
+class ResumeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        fixtures = tempfile.mkdtemp()
+        benchmark.generate_fixtures(fixtures, 1)
+        cls.server, cls.base_url = benchmark.start_fixture_server(fixtures, [])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_orphaned_job_is_resumed_on_startup(self):
+        # A worker on this host that died mid-job
+        worker = subprocess.Popen(['true'])
+        worker.wait()
+        params = {'url': f"{self.base_url}/tone.m4a", 'output_format': 'mp3', 'quality': 'best', 'bitrate': '128k',
+                  'preset': None, 'client_id': 'ip:127.0.0.1', 'playlist_range': None}
+        store = MemoryJobStore()
+        store.save('orphan', {'status': 'processing', 'progress': 40, 'error': None, 'output_file': None,
+                              'urls': [params['url']], 'current_url_index': 0, 'total_urls': 1,
+                              'playlist_info': None, 'preset': None, 'params': params, 'resumes': 0, 'stages': {},
+                              'subscribers': 1, 'cache_hits': 0, 'version': 3,
+                              'owner': f"{socket.gethostname()}:{worker.pid}", 'created': time.time(),
+                              'updated': time.time()})
+
+        with mock.patch('converter.create_job_store', return_value=store):
+            converter = MediaConverter()
+        deadline = time.time() + 60
+        status = converter.get_status('orphan')
+        while status['status'] not in ('completed', 'error') and time.time() < deadline:
+            time.sleep(0.2)
+            status = converter.get_status('orphan')
+        self.assertEqual(status['status'], 'completed', status.get('error'))
+        self.assertEqual(status['resumes'], 1)
+        self.assertNotIn('client_id', status['params'])
+        self.assertTrue(os.path.exists(status['output_file']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Metrics
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(directory=tempfile.mkdtemp())
+
+    def test_undeclared_histogram_uses_default_buckets(self):
+        self.metrics.observe('early_seconds', 0.3, stage='queue')
+        # Declaring it afterwards must not re-bucket the samples already counted
+        self.metrics.describe('early_seconds', 'histogram', 'Observed before it was declared', buckets=(1, 2))
+        self.metrics.observe('early_seconds', 4)
+
+        rendered = self.metrics.render()
+        self.assertIn('early_seconds_bucket{stage="queue",le="0.5"} 1', rendered)
+        self.assertIn('early_seconds_bucket{stage="queue",le="+Inf"} 1', rendered)
+        self.assertIn('early_seconds_bucket{le="5"} 1', rendered)
+        self.assertIn('early_seconds_count 1', rendered)
+
+
+if __name__ == '__main__':
+    unittest.main()
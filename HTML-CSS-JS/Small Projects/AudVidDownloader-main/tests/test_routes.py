@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.update(
+    MEDIA_WORK_DIR=tempfile.mkdtemp(),
+    MEDIA_METRICS_DIR=tempfile.mkdtemp(),
+    MEDIA_JOB_STORE='memory',
+    MEDIA_RATE_LIMIT_STORE='memory',
+    MEDIA_CACHE_MAX_BYTES='0'
+)
+
+from app import app
+from routes import converter
+
+
+class ConvertRouteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_invalid_requests_are_not_rate_limited(self):
+        with mock.patch.object(converter.limiter, 'check') as check:
+            response = self.client.post('/convert', json={'url': 'https://example.com/list', 'format': 'mp3',
+                                                          'playlist_start': 5, 'playlist_end': 2})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post('/convert', json={'url': 'ftp://example.com/a.mp3', 'format': 'mp3'})
+            self.assertEqual(response.status_code, 400)
+        check.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()